@@ -0,0 +1,187 @@
+"""Benchmark for the rich-text compiler in my_custom_tools.notion_richtext.
+
+Renders a synthetic workload shaped like a real run (lesson lines through
+`marked_text`, and quiz questions and options through `inline_math`, with each
+option rendered twice as `create_quiz_page` does, once for the quiz and once
+for the solutions page). It checks that the rich text Notion receives is
+identical to the original per-call regex implementations kept below, with their
+long runs split as notion_writer used to do before sending. Then it reports
+throughput with a cold memo (cleared before every repeat) and a warm one.
+
+With a cold memo the compiler is roughly on par with the original code, and can
+be a little slower. The gain comes from fragments that repeat, which are only
+tokenized once.
+
+Usage:
+    python benchmarks/bench_rich_text.py [--lessons N] [--repeat N] [--seed N]
+"""
+
+import argparse
+import copy
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from my_custom_tools import notion_richtext  # noqa: E402
+from my_custom_tools.notion_richtext import inline_math, marked_text  # noqa: E402
+
+WORDS = (
+    "gradient descent loss function attention head token embedding layer norm residual stream "
+    "probability distribution variance expectation matrix vector eigenvalue convergence rate"
+).split()
+FORMULAS = [r"x^2 + y^2", r"\frac{a}{b}", r"\sum_{i=1}^{n} x_i", r"\alpha \cdot \beta", r"e^{i\pi} + 1 = 0", r"\{bad"]
+
+
+def legacy_is_valid_latex(expr):
+    expr = expr.strip()
+    expr = re.sub(r"^\\\[|\\\]$|^\$\$|\$\$", "", expr)
+    return expr.count("{") == expr.count("}") and not re.search(r"\\[^a-zA-Z]", expr)
+
+
+def legacy_marked_text(text):
+    parts = []
+    pattern = r'(\*\*(.*?)\*\*|_(.*?)_|`([^`]*)`|\\\((.*?)\\\)|([^*_`\\]+))'
+    for match in re.finditer(pattern, text):
+        bold, bold_text, italic_text, code_text, math_inline, plain = match.groups()
+        if bold_text:
+            parts.append({"type": "text", "text": {"content": bold_text}, "annotations": {"bold": True}})
+        elif italic_text:
+            parts.append({"type": "text", "text": {"content": italic_text}, "annotations": {"italic": True}})
+        elif code_text:
+            parts.append({"type": "text", "text": {"content": code_text}, "annotations": {"code": True}})
+        elif math_inline and legacy_is_valid_latex(math_inline):
+            parts.append({"type": "equation", "equation": {"expression": math_inline.strip()}})
+        elif plain:
+            parts.append({"type": "text", "text": {"content": plain}})
+    return parts
+
+
+def legacy_inline_math(text, suffix=""):
+    parts = []
+    pattern = r'(\\\(.*?\\\))'
+    last_end = 0
+    for match in re.finditer(pattern, text):
+        start, end = match.span()
+        if start > last_end:
+            parts.append({"type": "text", "text": {"content": text[last_end:start]}})
+        expression = match.group(1)[2:-2].strip()
+        parts.append({"type": "equation", "equation": {"expression": expression}})
+        last_end = end
+    if last_end < len(text):
+        parts.append({"type": "text", "text": {"content": text[last_end:] + suffix}})
+    return parts
+
+
+def legacy_split(rich_text):
+    runs = []
+    for run in rich_text:
+        content = run.get("text", {}).get("content", "")
+        if run.get("type") != "text" or len(content) <= 2000:
+            runs.append(run)
+            continue
+        for start in range(0, len(content), 2000):
+            piece = copy.deepcopy(run)
+            piece["text"]["content"] = content[start:start + 2000]
+            runs.append(piece)
+    return runs
+
+
+def sentence(rng, markup):
+    words = []
+    for _ in range(rng.randint(6, 30)):
+        roll = rng.random()
+        word = rng.choice(WORDS)
+        if markup and roll < 0.08:
+            word = f"**{word}**"
+        elif markup and roll < 0.12:
+            word = f"_{word}_"
+        elif markup and roll < 0.15:
+            word = f"`{word}`"
+        elif roll < 0.22:
+            word = rf"\({rng.choice(FORMULAS)}\)"
+        words.append(word)
+    return " ".join(words) + rng.choice([".", "?", ""])
+
+
+def build_workload(lessons, seed):
+    """Returns (lesson lines, quiz questions, quiz options) with the repetition of a real run."""
+    rng = random.Random(seed)
+    lines, questions, options = [], [], []
+    for _ in range(lessons):
+        lines.extend(sentence(rng, markup=True) for _ in range(rng.randint(20, 40)))
+        if rng.random() < 0.2:
+            lines.append(" ".join(sentence(rng, markup=False) for _ in range(150)))
+        for _ in range(5):
+            questions.append(sentence(rng, markup=False))
+            question_options = [sentence(rng, markup=False)[:60] for _ in range(4)]
+            correct = rng.randrange(4)
+            options.extend((text, "") for text in question_options)
+            options.extend((text, " ✅" if i == correct else "") for i, text in enumerate(question_options))
+    # Shared lines (headings, boilerplate, repeated definitions) across lessons.
+    lines.extend(rng.sample(lines, len(lines) // 10))
+    return lines, questions, options
+
+
+def render(workload, marked, math):
+    lines, questions, options = workload
+    out = [marked(line) for line in lines]
+    for question in questions:
+        title = math(question)
+        out.append(title)
+        out.append(title)
+    out.extend(math(text, suffix) for text, suffix in options)
+    return out
+
+
+def legacy_render(workload):
+    return [legacy_split(runs) for runs in render(workload, legacy_marked_text, legacy_inline_math)]
+
+
+def current_render(workload):
+    return render(workload, marked_text, inline_math)
+
+
+def best_of(func, workload, repeat, cold):
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            notion_richtext.clear_cache()
+        start = time.perf_counter()
+        func(workload)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lessons", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workload = build_workload(args.lessons, args.seed)
+    fragments = len(workload[0]) + 2 * len(workload[1]) + len(workload[2])
+    print(f"Workload: {args.lessons} lessons, {fragments} fragments rendered")
+
+    notion_richtext.clear_cache()
+    if legacy_render(workload) != current_render(workload):
+        print("FAIL: rich text differs from the legacy implementation")
+        return 1
+
+    legacy_time = best_of(legacy_render, workload, args.repeat, cold=False)
+    cold_time = best_of(current_render, workload, args.repeat, cold=True)
+    warm_time = best_of(current_render, workload, args.repeat, cold=False)
+    print(f"legacy:        {legacy_time * 1e3:8.2f} ms")
+    print(f"current, cold: {cold_time * 1e3:8.2f} ms  ({legacy_time / cold_time:.2f}x)")
+    print(f"current, warm: {warm_time * 1e3:8.2f} ms  ({legacy_time / warm_time:.2f}x)")
+    print("outputs identical")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
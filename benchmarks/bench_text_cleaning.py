@@ -0,0 +1,98 @@
+"""Benchmark for the PDF text-cleaning pipeline in my_custom_tools.pdf_extraction.
+
+Extracts raw page text from real PDFs, checks that the current
+`remove_arxiv_footer` / `sanitize_text` produce byte-identical output to the
+original multi-pass implementations kept below, and reports throughput.
+
+Usage:
+    python benchmarks/bench_text_cleaning.py [PDF ...] [--repeat N]
+
+With no PDFs given, every PDF checked into the repository is used.
+"""
+
+import argparse
+import html
+import re
+import sys
+import time
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from my_custom_tools.pdf_extraction import remove_arxiv_footer, sanitize_text  # noqa: E402
+
+
+def legacy_sanitize_text(text: str) -> str:
+    text = text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
+    text = html.unescape(text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
+    text = text.replace('"', '\\"')
+    return text.strip()
+
+
+def legacy_remove_arxiv_footer(text: str) -> str:
+    lines = text.splitlines()
+    return "\n".join(
+        line for line in lines
+        if "arxiv" not in line.lower() and "preprint" not in line.lower()
+    )
+
+
+def legacy_clean(pages):
+    return legacy_sanitize_text("\n\n".join(legacy_remove_arxiv_footer(page) for page in pages))
+
+
+def clean(pages):
+    return sanitize_text("\n\n".join(remove_arxiv_footer(page) for page in pages))
+
+
+def load_corpus(paths):
+    pages = []
+    for path in paths:
+        with fitz.open(path) as doc:
+            pages.extend(page.get_text("text") for page in doc)
+    return pages
+
+
+def best_of(func, pages, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(pages)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*", type=Path)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    paths = args.pdfs or sorted(REPO_ROOT.rglob("*.pdf"))
+    pages = load_corpus(paths)
+    size_mb = sum(len(page.encode("utf-8")) for page in pages) / 1e6
+    print(f"Corpus: {len(paths)} PDFs, {len(pages)} pages, {size_mb:.2f} MB of raw text")
+
+    mismatches = [
+        i for i, page in enumerate(pages)
+        if legacy_clean([page]) != clean([page])
+    ]
+    if legacy_clean(pages) != clean(pages) or mismatches:
+        print(f"FAIL: output differs from the legacy pipeline (pages {mismatches[:10]})")
+        return 1
+
+    legacy_time = best_of(legacy_clean, pages, args.repeat)
+    new_time = best_of(clean, pages, args.repeat)
+    print(f"legacy:  {legacy_time * 1e3:8.2f} ms  {size_mb / legacy_time:8.1f} MB/s")
+    print(f"current: {new_time * 1e3:8.2f} ms  {size_mb / new_time:8.1f} MB/s")
+    print(f"speedup: {legacy_time / new_time:.2f}x (outputs identical)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
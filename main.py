@@ -7,11 +7,11 @@ from pydantic import BaseModel, Field
 from typing import Generic, TypeVar, List, Literal
 import os
 import json
-from notion_client import Client
 from my_custom_tools.registry import custom_tool_registry
 from portia.clarification import InputClarification
 from portia.plan_run import PlanRunState
-import shutil
+from my_custom_tools.workspace import cleanup_workspace
+from my_custom_tools import notion_writer
 
 load_dotenv(override=True)
 
@@ -19,8 +19,8 @@ load_dotenv(override=True)
 notion_api_key = os.getenv("NOTION_API_KEY")
 notion_parent_id = os.getenv("NOTION_PARENT_ID")
 
-# Initialize the Notion client
-notion = Client(auth=notion_api_key)
+# Shared Notion client, the same one the tools write through
+notion = notion_writer.get_client()
 
 
 
@@ -34,24 +34,6 @@ def planner(topic, constraints, further_reading = False, youtube_videos = False,
     portia = Portia(config = my_config,
                   tools = complete_tool_registry)
     
-    # Define the path to your papers folder
-    papers_folder = "papers"
-    
-    # Ensure the papers folder exists
-    if not os.path.exists(papers_folder):
-        os.makedirs(papers_folder)
-    else:
-        # If it exists, clear its contents
-        for filename in os.listdir(papers_folder):
-            file_path = os.path.join(papers_folder, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)  # remove file or symlink
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)  # remove directory
-            except Exception as e:
-                print(f'Failed to delete {file_path}. Reason: {e}')
-
     task = (
             lambda : f"""You are a research assistant running these tasks: 
                       - Find and download 1 paper on the topic of {topic} using the ArXivTool. 
@@ -127,12 +109,19 @@ def run_RAI(task_fn, clarification_response=None, clarification_context=None, ex
     
        
     
-    while run.state == PlanRunState.NEED_CLARIFICATION:
-        clarification = run.get_outstanding_clarifications()[0]
-        run = portia.resolve_clarification(clarification, str(clarification_response), run)
-        run = portia.resume(run)
+    try:
+        while run.state == PlanRunState.NEED_CLARIFICATION:
+            clarification = run.get_outstanding_clarifications()[0]
+            run = portia.resolve_clarification(clarification, str(clarification_response), run)
+            run = portia.resume(run)
+    finally:
+        # The run is finished either way, even if it raised: commit any buffered Notion writes,
+        # then drop its downloaded papers
+        try:
+            notion_writer.flush_run(run.id)
+        finally:
+            cleanup_workspace(run.id)
 
-    
     # Handle failed plan
     if run.state != PlanRunState.COMPLETE:
         raise Exception(f"Plan run failed with state {run.state}")
@@ -1,27 +1,25 @@
+import hashlib
 import os
 import requests
+from my_custom_tools import http_client
+from my_custom_tools.paper_store import get_store, link_or_copy, paper_key
+from my_custom_tools.workspace import papers_dir
 from pathlib import Path
-from typing import List, Dict, ClassVar, Type
-from typing import List, Dict, ClassVar, Type
+from typing import Any, List, Dict, ClassVar, Optional, Type
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from portia.cli import CLIExecutionHooks
 from portia import *
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 64 * 1024
 
 def strip_latex(text: str) -> str:
     """
     Remove LaTeX-style commands and math blocks from text.
     
-    Args:
-        text (str): Text potentially containing LaTeX formatting.
-    
-    Returns:
-        str: Cleaned text.
-    """
-    """
-    Remove LaTeX-style commands and math blocks from text.
-    
     Args:
         text (str): Text potentially containing LaTeX formatting.
     
@@ -38,16 +36,6 @@ def make_safe_filename(title: str, max_length: int = 25) -> str:
     """
     Create a safe file name from the paper title.
     
-    Args:
-        title (str): The title of the paper.
-        max_length (int, optional): Maximum length of the file name. Defaults to 25.
-    
-    Returns:
-        str: A sanitized file name ending with .pdf.
-    """
-    """
-    Create a safe file name from the paper title.
-    
     Args:
         title (str): The title of the paper.
         max_length (int, optional): Maximum length of the file name. Defaults to 25.
@@ -67,21 +55,6 @@ class DownloadPaperSchema(BaseModel):
     """
     Input schema for DownloadPaperTool.
     
-    Expected input format:
-    {
-      "papers": [
-        {
-          "title": "Paper Title",
-          "link": "https://example.com/paper.pdf",
-          "summary": "A brief summary of the paper."
-        },
-        ...
-      ]
-    }
-    """
-    """
-    Input schema for DownloadPaperTool.
-    
     Expected input format:
     {
       "papers": [
@@ -100,30 +73,29 @@ class DownloadPaperSchema(BaseModel):
             "A list of papers, each represented as a dictionary with keys 'title', 'link', and 'summary'. "
             "For example: {'title': 'Example Paper', 'link': 'https://example.com/paper.pdf', 'summary': 'A brief summary.'}"
         )
-        ...,
-        description=(
-            "A list of papers, each represented as a dictionary with keys 'title', 'link', and 'summary'. "
-            "For example: {'title': 'Example Paper', 'link': 'https://example.com/paper.pdf', 'summary': 'A brief summary.'}"
-        )
     )
 
-class DownloadPaperTool(Tool[str]):
+class DownloadPaperTool(Tool[List[Dict[str, Any]]]):
     id: ClassVar[str] = "download_tool"
     name: ClassVar[str] = "Download Tool"
     description: ClassVar[str] = (
-        "Downloads the papers from the provided URLs and stores them in the 'papers' folder. "
+        "Downloads the papers from the provided URLs and stores them in this run's 'papers' folder. "
         "Input must be a dictionary with a key 'papers' mapping to a list of paper dictionaries."
     )
     args_schema: Type[BaseModel] = DownloadPaperSchema
-    name: ClassVar[str] = "Download Tool"
-    description: ClassVar[str] = (
-        "Downloads the papers from the provided URLs and stores them in the 'papers' folder. "
-        "Input must be a dictionary with a key 'papers' mapping to a list of paper dictionaries."
+    output_schema: ClassVar[tuple[str, str]] = (
+        "list[dict]",
+        "One result per paper with 'title', 'path', 'bytes', 'duration' and 'error' keys."
     )
-    args_schema: Type[BaseModel] = DownloadPaperSchema
-    output_schema: ClassVar[tuple[str, str]] = ("str", "A confirmation message indicating success.")
 
-    def run(self, context: ToolRunContext, **kwargs) -> str:
+    # Maximum number of papers downloaded at the same time.
+    max_concurrency: int = 4
+    # Wall-clock limit in seconds for a single paper download.
+    download_timeout: float = 120.0
+    # Number of times a dropped connection is resumed with a Range request.
+    max_resumes: int = 3
+
+    def run(self, context: ToolRunContext, **kwargs) -> List[Dict[str, Any]]:
         """
         Accepts keyword arguments so that even if the orchestration engine sends a parameter
         named 'papers', it will be caught in kwargs. Then, validate the input using the Pydantic model.
@@ -131,48 +103,136 @@ class DownloadPaperTool(Tool[str]):
         # Validate and process the input
         validated_input = DownloadPaperSchema(**kwargs)
         papers = validated_input.papers
-    def run(self, context: ToolRunContext, **kwargs) -> str:
+
+        folder_name = "papers"
+        target_path = papers_dir(context)
+
+        workers = max(1, min(self.max_concurrency, len(papers)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda paper: self.download_paper(paper, target_path), papers))
+
+        count = sum(1 for result in results if result["status"] == "downloaded")
+        print(f"✅ Downloaded {count} paper{'s' if count != 1 else ''} into the '{folder_name}' folder")
+        return results
+
+    def download_paper(self, paper: Dict[str, str], target_path: Path) -> Dict[str, Any]:
         """
-        Accepts keyword arguments so that even if the orchestration engine sends a parameter
-        named 'papers', it will be caught in kwargs. Then, validate the input using the Pydantic model.
+        Downloads a single paper into `target_path`, reusing the shared paper store
+        when the same paper was fetched by an earlier run.
+
+        Args:
+            paper (dict): Paper dictionary with 'title' and 'link' keys.
+            target_path (Path): Folder the PDF is written to.
+
+        Returns:
+            dict: 'title', 'url', 'path', 'bytes', 'duration' (seconds), 'status'
+            ("downloaded", "cached", "exists", "skipped" or "failed") and 'error'.
         """
-        # Validate and process the input
-        validated_input = DownloadPaperSchema(**kwargs)
-        papers = validated_input.papers
+        title = strip_latex(paper["title"])
+        pdf_url = paper.get("link")
+        result = {"title": title, "url": pdf_url, "path": None, "bytes": 0,
+                  "duration": 0.0, "status": "skipped", "error": None}
+        if not pdf_url:
+            print(f"❌ Skipping paper with missing pdf_url: {title}")
+            result["error"] = "missing pdf_url"
+            return result
 
-        folder_name = "papers"
-        target_path = Path(folder_name)
-        target_path.mkdir(parents=True, exist_ok=True)
-        count = 0
-        
-        
-        for paper in papers:
-            title = strip_latex(paper["title"])
-            pdf_url = paper["link"]
-            if not pdf_url:
-                print(f"❌ Skipping paper with missing pdf_url: {title}")
-                continue
-            pdf_name = make_safe_filename(title)
-            pdf_name = make_safe_filename(title)
-            pdf_path = target_path / pdf_name
-            if not pdf_path.exists():
-                try:
-                    print(f"ℹ️ Downloading '{title}' from {pdf_url}")
-                    response = requests.get(pdf_url)
-                    response.raise_for_status()
-                    with open(pdf_path, "wb") as f:
-                        f.write(response.content)
-                    count += 1
-                except Exception as e:
-                    print(f"❌ Failed to download '{title}': {e}")
-                try:
-                    print(f"ℹ️ Downloading '{title}' from {pdf_url}")
-                    response = requests.get(pdf_url)
+        pdf_path = target_path / make_safe_filename(title)
+        result["path"] = str(pdf_path)
+        if pdf_path.exists():
+            result["status"] = "exists"
+            result["bytes"] = pdf_path.stat().st_size
+            return result
+
+        start = time.monotonic()
+        store = get_store()
+        key = paper_key(pdf_url)
+        stored = store.lookup(key)
+        if stored is not None:
+            print(f"ℹ️ Using stored copy of '{title}'")
+            link_or_copy(stored, pdf_path)
+            result["status"] = "cached"
+            result["bytes"] = pdf_path.stat().st_size
+            result["duration"] = round(time.monotonic() - start, 3)
+            return result
+
+        # Keyed on the URL, so papers whose titles sanitize to the same name never share a partial file
+        url_hash = hashlib.sha256(pdf_url.encode("utf-8")).hexdigest()[:16]
+        part_path = target_path / f"{url_hash}.part"
+        try:
+            print(f"ℹ️ Downloading '{title}' from {pdf_url}")
+            result["bytes"] = self._stream_to_file(pdf_url, part_path, start)
+            os.replace(part_path, pdf_path)
+            result["status"] = "downloaded"
+        except Exception as e:
+            print(f"❌ Failed to download '{title}': {e}")
+            result["status"] = "failed"
+            result["error"] = str(e)
+        result["duration"] = round(time.monotonic() - start, 3)
+
+        if result["status"] == "downloaded":
+            try:
+                store.add(key, pdf_path)
+            except Exception as e:
+                # The PDF is already in the workspace; only later runs lose the shared copy.
+                print(f"ℹ️ Could not add '{title}' to the paper store: {e}")
+        return result
+
+    def _stream_to_file(self, url: str, part_path: Path, start: float) -> int:
+        """
+        Streams `url` into `part_path`, resuming with a Range request whenever the
+        connection drops, and checks the finished file before it is moved into place.
+
+        A partial file left by an earlier attempt in the same run is resumed
+        rather than restarted; the workspace holding it is deleted when the run ends.
+        Files that fail the size or header checks are deleted.
+
+        Returns:
+            int: Size of the completed file in bytes.
+        """
+        expected_size = None
+        for attempt in range(self.max_resumes + 1):
+            offset = part_path.stat().st_size if part_path.exists() else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            try:
+                with http_client.get(url, stream=True, headers=headers) as response:
+                    if offset and response.status_code == 416:
+                        # Nothing left to fetch: the partial file is already complete.
+                        break
                     response.raise_for_status()
-                    with open(pdf_path, "wb") as f:
-                        f.write(response.content)
-                    count += 1
-                except Exception as e:
-                    print(f"❌ Failed to download '{title}': {e}")
-        
-        return f"✅ Downloaded {count} paper{'s' if count != 1 else ''} into the '{folder_name}' folder"
\ No newline at end of file
+                    if offset and response.status_code != 206:
+                        offset = 0  # Server ignored the Range header, start over.
+                    expected_size = _expected_size(response, offset) or expected_size
+                    with open(part_path, "ab" if offset else "wb") as f:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            if time.monotonic() - start > self.download_timeout:
+                                raise TimeoutError(f"download exceeded {self.download_timeout:.0f}s")
+                            f.write(chunk)
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+                if attempt == self.max_resumes:
+                    raise
+                print(f"ℹ️ Connection dropped ({e}), resuming {url}")
+
+        size = part_path.stat().st_size
+        with open(part_path, "rb") as f:
+            head = f.read(1024)
+        if expected_size is not None and size != expected_size:
+            part_path.unlink()
+            raise IOError(f"incomplete download: got {size} of {expected_size} bytes")
+        if b"%PDF" not in head:
+            part_path.unlink()
+            raise IOError("downloaded file is not a PDF")
+        return size
+
+
+def _expected_size(response, offset: int) -> Optional[int]:
+    """Total file size announced by the server, or None if it cannot be trusted."""
+    if response.headers.get("Content-Encoding", "identity") != "identity":
+        return None
+    content_range = response.headers.get("Content-Range", "")
+    if content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    length = response.headers.get("Content-Length")
+    return offset + int(length) if length and length.isdigit() else None
@@ -1,4 +1,4 @@
-from typing import Generic, TypeVar, List, ClassVar, Dict
+from typing import Generic, TypeVar, List, ClassVar, Callable, Dict, Iterable, Iterator, Optional, Tuple
 from portia import * 
 from dotenv import load_dotenv
 from portia.cli import CLIExecutionHooks
@@ -6,11 +6,93 @@ import requests
 import xml.etree.ElementTree as ET
 from pydantic import BaseModel, Field
 from typing import Generic, TypeVar, List
-from notion_client import Client
+import hashlib
+import json
 import os
-import openai
 import re
-import google.generativeai as genai
+from my_custom_tools.fanout import fan_out
+from my_custom_tools.line_stream import LineStream
+from my_custom_tools.llm import (
+    chat_completion,
+    gemini_generate,
+    llm_cache_stats,
+    stream_chat_completion,
+    stream_gemini_generate,
+)
+from my_custom_tools import notion_sync, notion_writer
+from my_custom_tools.notion_richtext import is_valid_latex, marked_text
+from my_custom_tools.QuizTool import parse_quiz
+
+
+LESSON_SYSTEM_PROMPT = (
+    "You're a tutor writing lesson content formatted for Notion pages. "
+    "Use clear section delimiters. Each section MUST begin with [[Section Name]] on its own line. "
+    "Sections: Introduction, Key Definitions, Relevant Formulas, Examples, Reflective Questions. "
+    "All math must be written using inline LaTeX formatted as \\( ... \\). "
+    "Do NOT use display math like \\[...\\], $$...$$, or {{math: ...}}. "
+    "Do NOT wrap equations in square brackets [ ... ] or parentheses like (\\( ... \\)). "
+    "In the 'Relevant Formulas' section, format each entry with a short bold title on one line, followed by the math on its own line in \\( ... \\). "
+    "Keep formulas concise and readable with no extra explanation unless absolutely necessary. "
+    "Only use valid LaTeX commands (e.g., \\frac, \\int, \\sum, \\left(, \\right)). "
+    "Each lesson must be self-contained: include 3-4 definitions, 2-3 formulas, 2 examples, and 5 reflective questions."
+)
+
+LESSON_FORMAT = (
+    "[[Introduction]]\n<short paragraph>\n\n[[Key Definitions]]\n- Definition 1\n- Definition 2\n- Definition 3\n\n[[Relevant Formulas]]\n"
+    "- For each formula, use a bold title and then place the math expression on its own line in \\( ... \\)\n\n"
+    "[[Examples]]\n<Include at least 2 real-world intuitive examples>\n\n[[Reflective Questions]]\n"
+    "1. Question 1\n2. Question 2\n3. Question 3\n4. Question 4\n5. Question 5"
+)
+
+QUIZ_SYSTEM_PROMPT = (
+    " After the lesson, add a [[Quiz]] section with a 5-question multiple choice quiz on the lesson, "
+    "using the same inline LaTeX rules for math."
+)
+
+QUIZ_FORMAT = (
+    "\n\n[[Quiz]]\n"
+    "Question 1: <question text>\nOptions:\nA. ...\nB. ...\nC. ...\nD. ...\nAnswer: A\n"
+    "(and so on up to Question 5)"
+)
+
+_QUIZ_MARKER = re.compile(r"^[ \t]*\[\[\s*quiz\s*\]\][ \t]*$", re.IGNORECASE | re.MULTILINE)
+
+_LESSON_MARKER = re.compile(r"^=== LESSON (\d+) ===[ \t]*$", re.MULTILINE)
+
+
+def lesson_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Yields a streamed draft's lines up to its [[Quiz]] section, then consumes the rest unseen."""
+    lines = iter(lines)
+    for line in lines:
+        if _QUIZ_MARKER.match(line):
+            break
+        yield line
+    for _ in lines:
+        pass
+
+
+def split_batch(text: str, count: int) -> List[Optional[str]]:
+    """
+    Splits a batched response on its '=== LESSON N ===' lines.
+
+    Returns:
+        list: One entry per lesson number 1..count; None where a lesson is missing,
+        repeated, empty or has no [[Section]] markers, so the caller can redo it alone.
+    """
+    parts: List[Optional[str]] = [None] * count
+    seen = set()
+    markers = list(_LESSON_MARKER.finditer(text))
+    for marker, following in zip(markers, markers[1:] + [None]):
+        number = int(marker.group(1))
+        body = text[marker.end():following.start() if following else len(text)].strip()
+        if not 1 <= number <= count:
+            continue
+        if number in seen:
+            parts[number - 1] = None
+            continue
+        seen.add(number)
+        parts[number - 1] = body if "[[" in body else None
+    return parts
 
 
 class NotionToolSchema(BaseModel):
@@ -28,14 +110,49 @@ class NotionTool(Tool[List[Dict[str, str]]]):
         "list[dict[str, str]]",
         "A list of dictionaries that have 'topic' and 'page_id' for each Notion page created."
     )
+    section_map: ClassVar[Dict[str, str]] = {
+        "introduction": "📘 Introduction",
+        "key definitions": "📾 Key Definitions",
+        "relevant formulas": "🔣 Relevant Formulas",
+        "examples": "💡 Examples",
+        "reflective questions": "🧠 Reflective Questions"
+    }
+    tracker_heading: ClassVar[str] = "📈 Progress Tracker"
+    # Fewest entries a section may have before the draft counts as incomplete.
+    minimum_counts: ClassVar[Dict[str, int]] = {
+        "key definitions": 3,
+        "relevant formulas": 2,
+        "reflective questions": 5,
+    }
+
+    # Reuse cached lesson/verification responses for identical prompts.
+    use_llm_cache: bool = True
+    # Number of topics generated and published at the same time.
+    max_concurrency: int = 4
+    # Stream each lesson into Notion as it is generated instead of waiting for all of it (see stream_lesson_blocks).
+    stream: bool = False
+    # Blocks sent per Notion request while streaming.
+    stream_batch_size: int = 10
+    # Send every lesson to the Gemini fact-checker, regardless of the local checks.
+    verify_all: bool = False
+    # Topics whose lessons are always fact-checked (case-insensitive).
+    high_risk_topics: List[str] = []
+    # Fraction of lessons that pass the local checks but are fact-checked anyway.
+    verify_sample_rate: float = 0.1
+    # Topics drafted (and verified) per LLM request; 1 makes one request per topic. Ignored when streaming.
+    batch_size: int = 1
+    # Generate each lesson's 5-question quiz in the same request, so QuizTool needs no LLM call.
+    fused_quiz: bool = False
+    # Reuse the pages published for the same topics before and only send the blocks that changed
+    # (streaming is turned off); the progress tracker, videos, reading and quiz pages are synced too.
+    update_existing: bool = False
 
     def run(self, context: ToolRunContext, topics: list[str]) -> List[Dict[str, str]]:
-        notion_api_key = os.getenv("NOTION_API_KEY")
         notion_parent_id = os.getenv("NOTION_PARENT_ID")
-        notion = Client(auth=notion_api_key)
 
-        notion.pages.update(
-            page_id=notion_parent_id,
+        notion_writer.update_page(
+            notion_parent_id,
+            context.plan_run_id,
             properties={
                 "title": [
                     {
@@ -46,20 +163,53 @@ class NotionTool(Tool[List[Dict[str, str]]]):
             }
         )
 
-        created_pages = []
-        checkbox_blocks = []
-
-        for topic in topics:
-            blocks, content = self.generate_lesson_blocks(topic)
-
-            response = notion.pages.create(
-                parent={"type": "page_id", "page_id": notion_parent_id},
-                properties={"title": [{"type": "text", "text": {"content": topic}}]},
-                children=blocks
-            )
-
-            created_pages.append({"topic": topic, "page_id": response["id"], "content": content})
+        def page_record(topic: str, page_id: str, content: str, info: Dict[str, str]) -> Dict[str, str]:
+            print(f"ℹ️ '{topic}': verification {info['verification']}, changed: {info['verification_changed']}")
+            record = {"topic": topic, "page_id": page_id, "content": content, **info}
+            if self.update_existing:
+                # Tells the tools that add to the page to sync their sections too.
+                record[notion_sync.SYNCED_KEY] = "true"
+            return record
+
+        def publish(topic: str, blocks: List[dict], content: str, info: Dict[str, str]) -> Dict[str, str]:
+            if self.update_existing:
+                return page_record(topic, notion_sync.sync_page(notion_parent_id, topic, blocks), content, info)
+            response = notion_writer.create_page(notion_parent_id, topic, blocks, context.plan_run_id)
+            return page_record(topic, response["id"], content, info)
+
+        def create_topic_page(topic: str) -> Dict[str, str]:
+            if self.stream and not self.update_existing:
+                blocks, finish = self.stream_lesson_blocks(topic)
+                response = notion_writer.create_page_streaming(
+                    notion_parent_id, topic, blocks, self.stream_batch_size, context.plan_run_id
+                )
+                return page_record(topic, response["id"], *finish(response["id"]))
+            return publish(topic, *self.generate_lesson_blocks(topic))
+
+        def create_batch_pages(batch: List[str]) -> List[Dict[str, str]]:
+            return [publish(topic, *lesson) for topic, lesson in zip(batch, self.generate_lesson_batch(batch))]
+
+        if self.batch_size > 1 and (self.update_existing or not self.stream):
+            batches = [topics[i:i + self.batch_size] for i in range(0, len(topics), self.batch_size)]
+            outcome = fan_out(batches, create_batch_pages, self.max_concurrency)
+            for batch, error in outcome.failures():
+                print(f"❌ Failed to create lessons for {', '.join(batch)}: {error}")
+            created_pages = [page for pages in outcome.succeeded() for page in pages]
+        else:
+            outcome = fan_out(topics, create_topic_page, self.max_concurrency)
+            for topic, error in outcome.failures():
+                print(f"❌ Failed to create lesson for '{topic}': {error}")
+            created_pages = outcome.succeeded()
+
+        tracked_topics = [page["topic"] for page in created_pages]
+        if self.update_existing:
+            # Every topic page kept under the parent, so earlier runs' topics stay on the tracker.
+            tracked_topics = [
+                name for name in notion_sync.get_index().names(notion_parent_id) if name != self.tracker_heading
+            ]
 
+        checkbox_blocks = []
+        for topic in tracked_topics:
             checkbox_blocks.append({
                 "object": "block",
                 "type": "to_do",
@@ -92,80 +242,66 @@ class NotionTool(Tool[List[Dict[str, str]]]):
 
         # created_pages.append({"topic": "Paper Summary", "page_id": response["id"], "content": "summary of paper"})
 
-        notion.blocks.children.append(
-            block_id=notion_parent_id,
-            children=[
-                {
-                    "object": "block",
-                    "type": "heading_2",
-                    "heading_2": {
-                        "rich_text": [
-                            {
-                                "type": "text",
-                                "text": {"content": "📈 Progress Tracker"}
-                            }
-                        ]
-                    }
-                },
-                *checkbox_blocks
-            ]
-        )
-
+        tracker_blocks = [
+            {
+                "object": "block",
+                "type": "heading_2",
+                "heading_2": {
+                    "rich_text": [
+                        {
+                            "type": "text",
+                            "text": {"content": self.tracker_heading}
+                        }
+                    ]
+                }
+            },
+            *checkbox_blocks
+        ]
+        if self.update_existing:
+            notion_sync.sync_blocks(notion_parent_id, self.tracker_heading, tracker_blocks)
+        else:
+            notion_writer.queue_append(context.plan_run_id, notion_parent_id, tracker_blocks)
+
+        stats = llm_cache_stats()
+        print(f"ℹ️ LLM cache: {stats['hits']} hits, {stats['misses']} misses")
         return created_pages
 
-    def generate_lesson_blocks(self, topic: str) -> List[dict]:
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-        section_map = {
-            "introduction": "📘 Introduction",
-            "key definitions": "📾 Key Definitions",
-            "relevant formulas": "🔣 Relevant Formulas",
-            "examples": "💡 Examples",
-            "reflective questions": "🧠 Reflective Questions"
-        }
-
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": (
-                    "You're a tutor writing lesson content formatted for Notion pages. "
-                    "Use clear section delimiters. Each section MUST begin with [[Section Name]] on its own line. "
-                    "Sections: Introduction, Key Definitions, Relevant Formulas, Examples, Reflective Questions. "
-                    "All math must be written using inline LaTeX formatted as \\( ... \\). "
-                    "Do NOT use display math like \\[...\\], $$...$$, or {{math: ...}}. "
-                    "Do NOT wrap equations in square brackets [ ... ] or parentheses like (\\( ... \\)). "
-                    "In the 'Relevant Formulas' section, format each entry with a short bold title on one line, followed by the math on its own line in \\( ... \\). "
-                    "Keep formulas concise and readable with no extra explanation unless absolutely necessary. "
-                    "Only use valid LaTeX commands (e.g., \\frac, \\int, \\sum, \\left(, \\right)). "
-                    "Each lesson must be self-contained: include 3-4 definitions, 2-3 formulas, 2 examples, and 5 reflective questions."
-                )},
-                {"role": "user", "content": (
-                    f"Write a comprehensive and self-contained lesson on '{topic}' using this exact format with [[Section Name]] delimiters.\n"
-                    "[[Introduction]]\n<short paragraph>\n\n[[Key Definitions]]\n- Definition 1\n- Definition 2\n- Definition 3\n\n[[Relevant Formulas]]\n"
-                    "- For each formula, use a bold title and then place the math expression on its own line in \\( ... \\)\n\n"
-                    "[[Examples]]\n<Include at least 2 real-world intuitive examples>\n\n[[Reflective Questions]]\n"
-                    "1. Question 1\n2. Question 2\n3. Question 3\n4. Question 4\n5. Question 5"
-                )}
-            ],
-            temperature=0.3
-        )
-
-        content = response.choices[0].message.content.strip()
-
-        api_key = os.getenv("GEMINI_API_KEY")
-        genai.configure(api_key=api_key)
-
-        generation_config = genai.types.GenerationConfig(
-            temperature=0.2
-        )
-
-        model_name = "gemini-2.0-flash" 
-        model = genai.GenerativeModel(
-            model_name=model_name,
-            generation_config=generation_config,
-        )
-
-        verify_prompt = (
+    def _system_prompt(self) -> str:
+        return LESSON_SYSTEM_PROMPT + (QUIZ_SYSTEM_PROMPT if self.fused_quiz else "")
+
+    def _lesson_format(self) -> str:
+        return LESSON_FORMAT + (QUIZ_FORMAT if self.fused_quiz else "")
+
+    def _split_quiz(self, draft: str) -> Tuple[str, List[Dict[str, str]]]:
+        """Separates a fused draft into the lesson text and its parsed [[Quiz]] section."""
+        match = _QUIZ_MARKER.search(draft)
+        if not match:
+            return draft, []
+        return draft[:match.start()].strip(), parse_quiz(draft[match.end():].strip())
+
+    def _lesson_messages(self, topic: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self._system_prompt()},
+            {"role": "user", "content": (
+                f"Write a comprehensive and self-contained lesson on '{topic}' using this exact format with [[Section Name]] delimiters.\n"
+                + self._lesson_format()
+            )}
+        ]
+
+    def _batch_lesson_messages(self, topics: List[str]) -> List[Dict[str, str]]:
+        listing = "\n".join(f"{i}. {topic}" for i, topic in enumerate(topics, 1))
+        return [
+            {"role": "system", "content": self._system_prompt()},
+            {"role": "user", "content": (
+                f"Write {len(topics)} comprehensive and self-contained lessons, one for each of these topics:\n{listing}\n\n"
+                "Start each lesson with a line '=== LESSON <number> ===' using the topic's number above, "
+                "and write the lessons in that order. Each lesson must use this exact format with [[Section Name]] delimiters.\n"
+                + self._lesson_format()
+            )}
+        ]
+
+    def _verify_prompt(self, content: str) -> str:
+        return (
             "You are a factual checker for educational content.\n"
             "Your job is to read the following lesson and correct any factual errors, math mistakes, or misleading information.\n"
             "Do NOT alter the structure, formatting, section headers, or LaTeX math delimiters (\\( ... \\)).\n"
@@ -175,14 +311,230 @@ class NotionTool(Tool[List[Dict[str, str]]]):
             f"{content}"
         )
 
-        revision = model.generate_content(verify_prompt)
+    def _batch_verify_prompt(self, contents: List[str]) -> str:
+        lessons = "\n\n".join(f"=== LESSON {i} ===\n{content}" for i, content in enumerate(contents, 1))
+        return (
+            "You are a factual checker for educational content.\n"
+            "Your job is to read the following lessons and correct any factual errors, math mistakes, or misleading information.\n"
+            "Each lesson starts with a line '=== LESSON <number> ==='. Keep these lines exactly as they are, and keep the lessons in order.\n"
+            "Do NOT alter the structure, formatting, section headers, or LaTeX math delimiters (\\( ... \\)).\n"
+            "Keep bullet points, numbering, and headings exactly as they are.\n"
+            "If a lesson is already correct, return it unchanged.\n\n"
+            "Return ONLY the revised lessons — no commentary, explanation, or summary.\n\n"
+            f"{lessons}"
+        )
 
-        content = revision.text.strip() 
-        
-        blocks = []
-        section = None
+    def _draft_lesson(self, topic: str) -> str:
+        return chat_completion(
+            messages=self._lesson_messages(topic),
+            model="gpt-4o",
+            temperature=0.3,
+            use_cache=self.use_llm_cache,
+        )
+
+    def _verify_lesson(self, draft: str) -> str:
+        return gemini_generate(
+            self._verify_prompt(draft),
+            model="gemini-2.0-flash",
+            temperature=0.2,
+            use_cache=self.use_llm_cache,
+        )
 
+    def lesson_problems(self, content: str) -> List[str]:
+        """
+        Cheap local checks of a drafted lesson.
+
+        Returns:
+            list[str]: Problems found (missing sections, too few definitions,
+            formulas or questions, malformed LaTeX); empty if the lesson looks sound.
+        """
+        counts = {section: 0 for section in self.section_map}
+        section = None
         for line in content.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("[[") and line.endswith("]]"):
+                section = line[2:-2].strip().lower()
+                continue
+            if section == "relevant formulas" and not re.search(r"\\\(.*?\\\)", line):
+                continue
+            if section in counts:
+                counts[section] += 1
+
+        problems = [f"missing section '{name}'" for name, count in counts.items() if count == 0]
+        for name, minimum in self.minimum_counts.items():
+            if 0 < counts[name] < minimum:
+                problems.append(f"only {counts[name]} entries in '{name}'")
+        if content.count("\\(") != content.count("\\)"):
+            problems.append("unbalanced math delimiters")
+        for expr in re.findall(r"\\\((.*?)\\\)", content):
+            if not self._is_valid_latex(expr):
+                problems.append(f"invalid LaTeX: {expr.strip()[:40]}")
+                break
+        return problems
+
+    def policy_reason(self, topic: str) -> Optional[str]:
+        """Why the topic's lesson goes to the remote verifier whatever its draft looks like, or None."""
+        if self.verify_all:
+            return "always"
+        if topic.strip().lower() in {t.strip().lower() for t in self.high_risk_topics}:
+            return "high-risk topic"
+        # Hash-based sampling keeps the decision (and the LLM cache hit) stable across runs.
+        bucket = int(hashlib.sha256(topic.encode("utf-8")).hexdigest(), 16) % 10_000
+        if bucket < self.verify_sample_rate * 10_000:
+            return "sampled"
+        return None
+
+    def verification_reason(self, topic: str, draft: str) -> Optional[str]:
+        """Why the draft should go to the remote verifier, or None to publish it as is."""
+        reason = self.policy_reason(topic)
+        if reason == "always":
+            return reason
+        problems = self.lesson_problems(draft)
+        if problems:
+            return "failed checks: " + "; ".join(problems)
+        return reason
+
+    def _lesson_info(self, reason: Optional[str], draft: str, content: str, quiz: List[Dict[str, str]]) -> Dict[str, str]:
+        info = {
+            "verification": reason or "skipped",
+            "verification_changed": str(content.split() != draft.split()).lower(),
+        }
+        # Only a complete fused quiz is handed on; otherwise QuizTool writes its own.
+        if len(quiz) == 5:
+            info["quiz"] = json.dumps(quiz, ensure_ascii=False)
+        return info
+
+    def generate_lesson_blocks(self, topic: str) -> Tuple[List[dict], str, Dict[str, str]]:
+        """
+        Drafts a lesson, verifies it if the policy asks for it, and parses it into blocks.
+
+        Returns:
+            tuple: The Notion blocks, the lesson text, and lesson info: verification
+            stats ('verification': reason or "skipped", 'verification_changed':
+            "true"/"false") and, with `fused_quiz`, the quiz as JSON under 'quiz'.
+        """
+        draft, quiz = self._split_quiz(self._draft_lesson(topic))
+        reason = self.verification_reason(topic, draft)
+        content = draft if reason is None else self._verify_lesson(draft)
+        blocks = list(self.lesson_blocks_from_lines(content.splitlines()))
+        return blocks, content, self._lesson_info(reason, draft, content, quiz)
+
+    def generate_lesson_batch(self, topics: List[str]) -> List[Tuple[List[dict], str, Dict[str, str]]]:
+        """
+        Batched counterpart of `generate_lesson_blocks`.
+
+        All lessons are drafted in one gpt-4o request, and the ones the
+        verification policy selects are checked in one Gemini request. Lessons
+        that are missing or malformed in a batched response are redone with the
+        per-topic calls.
+
+        Returns:
+            list[tuple]: (blocks, content, lesson info) per topic, in order.
+        """
+        drafts = split_batch(chat_completion(
+            messages=self._batch_lesson_messages(topics),
+            model="gpt-4o",
+            temperature=0.3,
+            use_cache=self.use_llm_cache,
+        ), len(topics))
+        # A lesson cut short (e.g. by the output limit) is redone rather than verified.
+        drafts = [
+            draft if draft and all(f"[[{name}]]" in draft.lower() for name in self.section_map) else None
+            for draft in drafts
+        ]
+        if None in drafts:
+            print(f"⚠️ Batched lessons came back incomplete; drafting {drafts.count(None)} of {len(topics)} one by one")
+        drafts, quizzes = zip(*(
+            self._split_quiz(draft or self._draft_lesson(topic)) for topic, draft in zip(topics, drafts)
+        ))
+
+        reasons = [self.verification_reason(topic, draft) for topic, draft in zip(topics, drafts)]
+        to_verify = [i for i, reason in enumerate(reasons) if reason is not None]
+        verified: List[Optional[str]] = [None] * len(to_verify)
+        if len(to_verify) > 1:
+            verified = split_batch(gemini_generate(
+                self._batch_verify_prompt([drafts[i] for i in to_verify]),
+                model="gemini-2.0-flash",
+                temperature=0.2,
+                use_cache=self.use_llm_cache,
+            ), len(to_verify))
+            if None in verified:
+                print(f"⚠️ Batched verification came back incomplete; verifying {verified.count(None)} of {len(to_verify)} one by one")
+
+        contents = list(drafts)
+        for i, content in zip(to_verify, verified):
+            contents[i] = content or self._verify_lesson(drafts[i])
+
+        return [
+            (list(self.lesson_blocks_from_lines(content.splitlines())), content, self._lesson_info(reason, draft, content, quiz))
+            for draft, quiz, reason, content in zip(drafts, quizzes, reasons, contents)
+        ]
+
+    def stream_lesson_blocks(
+        self, topic: str
+    ) -> Tuple[Iterator[dict], Callable[[str], Tuple[str, Dict[str, str]]]]:
+        """
+        Streaming counterpart of `generate_lesson_blocks`.
+
+        When the policy verifies the topic whatever its draft says (`verify_all`,
+        high-risk or sampled), the draft is generated in full and the verified
+        lesson is streamed. Otherwise the draft itself is streamed as it is
+        written. If the finished draft then fails the local checks, it is verified
+        and the page is corrected with only the blocks that changed, so readers
+        can briefly see the unverified draft of such a lesson.
+
+        Returns:
+            tuple: An iterator of Notion blocks, emitted as each line completes,
+            and `finish(page_id)`, to be called once the blocks are exhausted and
+            published to that page. It applies any correction and returns the
+            lesson text and the lesson info.
+        """
+        if self.policy_reason(topic) is not None:
+            draft, quiz = self._split_quiz(self._draft_lesson(topic))
+            reason = self.verification_reason(topic, draft)
+            verified = LineStream(stream_gemini_generate(
+                self._verify_prompt(draft),
+                model="gemini-2.0-flash",
+                temperature=0.2,
+                use_cache=self.use_llm_cache,
+            ))
+
+            def finish_verified(page_id: str) -> Tuple[str, Dict[str, str]]:
+                return verified.text, self._lesson_info(reason, draft, verified.text, quiz)
+
+            return self.lesson_blocks_from_lines(verified), finish_verified
+
+        lines = LineStream(stream_chat_completion(
+            messages=self._lesson_messages(topic),
+            model="gpt-4o",
+            temperature=0.3,
+            use_cache=self.use_llm_cache,
+        ))
+        published: List[dict] = []
+
+        def draft_blocks() -> Iterator[dict]:
+            for block in self.lesson_blocks_from_lines(lesson_lines(lines)):
+                published.append(block)
+                yield block
+
+        def finish_draft(page_id: str) -> Tuple[str, Dict[str, str]]:
+            draft, quiz = self._split_quiz(lines.text)
+            reason = self.verification_reason(topic, draft)
+            content = draft
+            if reason is not None:
+                content = self._verify_lesson(draft)
+                notion_sync.replace_published(page_id, published, self.lesson_blocks_from_lines(content.splitlines()))
+            return content, self._lesson_info(reason, draft, content, quiz)
+
+        return draft_blocks(), finish_draft
+
+    def lesson_blocks_from_lines(self, lines: Iterable[str]) -> Iterator[dict]:
+        """Parses [[Section]]-delimited lesson lines into Notion blocks, one line at a time."""
+        section = None
+
+        for line in lines:
             line = line.strip()
             if not line:
                 continue
@@ -190,52 +542,31 @@ class NotionTool(Tool[List[Dict[str, str]]]):
             # Section detection
             if line.startswith("[[") and line.endswith("]]"):
                 section = line[2:-2].strip().lower()
-                if section in section_map:
-                    blocks.append(self._heading_block(section_map[section]))
+                if section in self.section_map:
+                    yield self._heading_block(self.section_map[section])
                 continue
 
             # Clean awkward (\( ... \)) patterns
             line = re.sub(r"\(\\\((.*?)\\\)\)", r"\\(\1\\)", line)
 
             if section == "key definitions":
-                blocks.append(self._bulleted(self._clean_list_prefix(line)))
+                yield self._bulleted(self._clean_list_prefix(line))
             elif section == "relevant formulas":
                 # Keep minimal formula display inline
-                if re.search(r"\\\(.*?\\\)", line):
-                    blocks.append(self._paragraph(line))
-                else:
-                    blocks.append(self._paragraph(line))
+                yield self._paragraph(line)
             elif section == "reflective questions":
-                blocks.append(self._numbered(self._clean_list_prefix(line)))
+                yield self._numbered(self._clean_list_prefix(line))
             else:
-                blocks.append(self._paragraph(line))
-
-        return blocks, content
+                yield self._paragraph(line)
 
     def _clean_list_prefix(self, text):
         return re.sub(r"^(\d+\.\s+|[-*]\s+)", "", text)
 
     def _is_valid_latex(self, expr):
-        expr = expr.strip()
-        expr = re.sub(r"^\\\[|\\\]$|^\$\$|\$\$", "", expr)
-        return expr.count("{") == expr.count("}") and not re.search(r"\\[^a-zA-Z]", expr)
+        return is_valid_latex(expr)
 
     def _rich_text_from_marked_text(self, text):
-        parts = []
-        pattern = r'(\*\*(.*?)\*\*|_(.*?)_|`([^`]*)`|\\\((.*?)\\\)|([^*_`\\]+))'
-        for match in re.finditer(pattern, text):
-            bold, bold_text, italic_text, code_text, math_inline, plain = match.groups()
-            if bold_text:
-                parts.append({"type": "text", "text": {"content": bold_text}, "annotations": {"bold": True}})
-            elif italic_text:
-                parts.append({"type": "text", "text": {"content": italic_text}, "annotations": {"italic": True}})
-            elif code_text:
-                parts.append({"type": "text", "text": {"content": code_text}, "annotations": {"code": True}})
-            elif math_inline and self._is_valid_latex(math_inline):
-                parts.append({"type": "equation", "equation": {"expression": math_inline.strip()}})
-            elif plain:
-                parts.append({"type": "text", "text": {"content": plain}})
-        return parts
+        return marked_text(text)
 
     def _heading_block(self, text):
         return {
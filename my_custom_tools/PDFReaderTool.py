@@ -1,98 +1,93 @@
 from pathlib import Path
-import fitz  # PyMuPDF
 from pydantic import BaseModel
 from portia import Tool, ToolHardError, ToolRunContext
-from typing import ClassVar, Dict
-import re
-import html
-
-def sanitize_text(text: str) -> str:
-    # Replace newlines, tabs, and carriage returns with space
-    text = text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-
-    # Unescape any HTML entities (if any were accidentally included)
-    text = html.unescape(text)
-
-    # Collapse multiple spaces into one
-    text = re.sub(r'\s+', ' ', text)
-
-    # Remove control characters except basic punctuation
-    text = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', text)
-
-    # Escape quotes if planning to inject into a JSON string directly
-    text = text.replace('"', '\\"')
-
-    # Strip leading/trailing whitespace again after cleaning
-    return text.strip()
+from typing import ClassVar, Dict, Optional
+from my_custom_tools.workspace import papers_dir
+from my_custom_tools.pdf_extraction import (
+    extract_texts,
+    get_text_cache,
+    is_bibliography_page,
+    read_pdf,
+    remove_arxiv_footer,
+    sanitize_text,
+    SPILL_THRESHOLD,
+)
+from my_custom_tools.chunking import PAPER_TOKEN_BUDGET
+from my_custom_tools.text_compression import compress_text
+import os
 
 
 class PDFReaderToolSchema(BaseModel):
-    """No input needed. Reads all PDFs from the papers folder."""
+    """No input needed. Reads all PDFs from the run's papers folder."""
     pass
 
 
 class PDFReaderTool(Tool[Dict[str, str]]):
-    """Reads and returns full text from all PDFs in the ./papers/ folder."""
+    """Reads and returns full text from all PDFs in the run's papers/ folder."""
 
     id: ClassVar[str] = "pdf_reader_tool"
     name: ClassVar[str] = "PDF reader tool"
-    description: ClassVar[str] = "Reads all PDFs from the local 'papers' folder and returns their full text"
+    description: ClassVar[str] = "Reads all PDFs from this run's 'papers' folder and returns their full text"
     args_schema = PDFReaderToolSchema
     output_schema: ClassVar[tuple[str, str]] = ("dict", "Dictionary of filename -> full text")
 
-    def run(self, ctx: ToolRunContext) -> Dict[str, str]:
-        """Extracts and returns full text from all PDFs in the ./papers folder."""
-        
-        papers_dir = Path.cwd() / "papers"
+    # Worker processes used to read several PDFs at once (None = one per CPU, 1 = serial).
+    max_workers: Optional[int] = None
+    # Seconds to wait for each file before reporting it as an error.
+    file_timeout: float = 300.0
+    # Processes used to split one long PDF into page ranges (None = one per CPU).
+    page_workers: Optional[int] = None
+    # Characters of each paper's text held in memory before it spills to a temporary file.
+    spill_threshold: int = SPILL_THRESHOLD
+    # Estimated tokens each paper is extractively compressed to before it reaches the planner and PSTool
+    # (None = keep full text). Page markers are kept. Defaults to PSTool.token_budget, so compressed papers
+    # go straight to the summary; set it higher (or None) to have PSTool condense the rest chunk by chunk.
+    compress_tokens: Optional[int] = PAPER_TOKEN_BUDGET
 
-        if not papers_dir.exists() or not papers_dir.is_dir():
-            raise ToolHardError("The 'papers/' folder does not exist.")
+    def run(self, ctx: ToolRunContext) -> Dict[str, str]:
+        """Extracts and returns full text from all PDFs in the run's papers folder."""
 
-        pdf_files = list(papers_dir.glob("*.pdf"))
+        pdf_files = list(papers_dir(ctx).glob("*.pdf"))
         if not pdf_files:
             raise ToolHardError("No PDF files found in the 'papers/' folder.")
 
-        texts = {}
-        for file_path in pdf_files:
-            try:
-                full_text = self.read_pdf(file_path)
-                cleaned_full_text = sanitize_text(full_text)
-                texts[file_path.name] = cleaned_full_text
-            except Exception as e:
-                texts[file_path.name] = f"Error reading file: {str(e)}"
+        max_workers = self.max_workers or os.cpu_count() or 1
+        page_workers = self.page_workers or os.cpu_count() or 1
+        handles = extract_texts(
+            pdf_files,
+            max_workers=max_workers,
+            timeout=self.file_timeout,
+            page_workers=page_workers,
+            spill_threshold=self.spill_threshold,
+        )
+        stats = get_text_cache().stats()
+        print(f"ℹ️ Text cache: {stats['hits']} hits, {stats['misses']} misses")
 
+        # Papers are read from their (possibly spilled) handles one at a time; only the output
+        # strings are kept, which compression bounds. Without compression they are the full texts.
+        texts = {}
+        try:
+            for name, handle in handles.items():
+                with handle:
+                    if handle.failed or self.compress_tokens is None:
+                        texts[name] = handle.read()
+                        continue
+                    result = compress_text(handle, self.compress_tokens)
+                texts[name] = result.text
+                print(f"ℹ️ {name}: ~{result.tokens_before} tokens -> ~{result.tokens_after} after compression")
+        finally:
+            for handle in handles.values():
+                handle.close()
         return texts
 
     def read_pdf(self, file_path: Path) -> str:
         """Extracts and cleans text from a PDF file, stopping before References/Bibliography."""
-        text = []
-        with fitz.open(file_path) as doc:
-            for page_num, page in enumerate(doc):
-                page_text = page.get_text("text")
-                cleaned_text = self._remove_arxiv_footer(page_text)
-
-                #Check for 'References' or 'Bibliography' section header
-                if self._is_bibliography_page(cleaned_text):
-                    print(f"Stopping at page {page_num + 1} (found References section).")
-                    break
-
-                text.append(f"--- Page {page_num + 1} ---\n{cleaned_text.strip()}")
-        return "\n\n".join(text)
+        return read_pdf(file_path, page_workers=self.page_workers or os.cpu_count() or 1)
 
     def _remove_arxiv_footer(self, text: str) -> str:
         """Removes common arXiv-style footers."""
-        lines = text.splitlines()
-        return "\n".join(
-            line for line in lines
-            if "arxiv" not in line.lower() and "preprint" not in line.lower()
-        )
-    
+        return remove_arxiv_footer(text)
+
     def _is_bibliography_page(self, text: str) -> bool:
         """Returns True if the page looks like it's starting the bibliography or references."""
-        lowered = text.lower()
-        # Check if 'references' or 'bibliography' is a standalone word early in the text
-        return (
-            "references\n" in lowered
-            or lowered.strip().startswith("references")
-            or lowered.strip().startswith("bibliography")
-        )
\ No newline at end of file
+        return is_bibliography_page(text)
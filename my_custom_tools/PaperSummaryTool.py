@@ -4,11 +4,16 @@ from portia import *
 import requests
 import xml.etree.ElementTree as ET
 from pydantic import BaseModel, Field
-from typing import Generic, TypeVar, List, ClassVar, Dict, Literal, Type
-from notion_client import Client
+from itertools import chain
+from typing import Generic, TypeVar, List, ClassVar, Dict, Iterable, Iterator, Literal, Type
 import os
+from my_custom_tools import notion_writer
 from my_custom_tools.utils import truncate_at_sentence
-import openai
+from my_custom_tools.chunking import CHARS_PER_TOKEN, PAPER_TOKEN_BUDGET, chunk_text, estimate_tokens
+from my_custom_tools.fanout import fan_out
+from my_custom_tools.line_stream import LineStream
+from my_custom_tools.llm import chat_completion, stream_chat_completion
+from my_custom_tools.llm_scheduler import BATCH
 
 
 class PSToolSchema(BaseModel): 
@@ -29,6 +34,31 @@ class PSTool(Tool[None]):
         "None",
         "This tool does not return anything."
     )
+    section_heading_map: ClassVar[Dict[str, str]] = {
+        "intuitive understanding": "🧠 Intuitive Understanding",
+        "method breakdown": "⚙️ Method Breakdown",
+        "novelties / contributions": "🌟 Novelties / Contributions",
+        "critiques": "🧪 Critiques",
+        "related reading": "📚 Related Reading"
+    }
+
+    # Reuse a cached summary when the same paper text is summarized again.
+    use_llm_cache: bool = True
+    # Stream the summary into Notion as it is generated instead of waiting for all of it.
+    stream: bool = False
+    # Blocks sent per Notion request while streaming.
+    stream_batch_size: int = 10
+    # Papers estimated above this many tokens are summarized chunk by chunk first. PDFReaderTool compresses
+    # to the same budget by default, so this only kicks in when its compression is off or set higher.
+    token_budget: int = PAPER_TOKEN_BUDGET
+    # Token budget of each chunk in the map step.
+    chunk_tokens: int = 6000
+    # Model used to condense chunks; the final summary always uses gpt-4o.
+    chunk_model: str = "gpt-4o-mini"
+    # Number of chunks summarized at the same time.
+    max_concurrency: int = 4
+    # Estimated tokens of raw text kept in place of a chunk whose notes still failed after the scheduler's retries.
+    fallback_tokens: int = 1500
 
     def run(self, context, papers: List[Dict[str, str]], pdf_texts: Dict[str, str]) -> None:
         """Adds Notion page and fills it with paper summary."""
@@ -38,11 +68,9 @@ class PSTool(Tool[None]):
         if not notion_api_key:
             raise EnvironmentError("Missing NOTION_API_KEY or GOOGLE_API_KEY")
 
-        notion = Client(auth=notion_api_key)
         notion_parent_id = os.getenv("NOTION_PARENT_ID")
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-        pdf_text = next(iter(pdf_texts.values()), "")
+        pdf_text = self.condense(next(iter(pdf_texts.values()), ""))
 
         blocks = []
         paper = papers[0]
@@ -81,9 +109,76 @@ class PSTool(Tool[None]):
 
         blocks.append(link_block)
 
-        response1 = client.chat.completions.create(
+        if self.stream:
+            lines = LineStream(stream_chat_completion(**self._summary_request(pdf_text)))
+            notion_writer.create_page_streaming(
+                notion_parent_id, "Paper Summary",
+                chain(blocks, self.summary_blocks_from_lines(lines)), self.stream_batch_size, context.plan_run_id
+            )
+            return
+
+        generated_content = chat_completion(**self._summary_request(pdf_text))
+        blocks.extend(self.summary_blocks_from_lines(generated_content.splitlines()))
+
+        notion_writer.queue_pages(context.plan_run_id, [(notion_parent_id, "Paper Summary", blocks)])
+        
+    
+        return
+
+    def condense(self, pdf_text: str) -> str:
+        """
+        Map step for long papers: returns the text unchanged when it fits the
+        token budget, otherwise concatenated notes from summarizing each chunk in
+        parallel. The final summary request then acts as the reduce step, so the
+        output keeps the same [[Section]] structure either way. A part whose notes
+        fail is kept, numbered and marked, as a truncated excerpt of its raw text.
+        """
+        tokens = estimate_tokens(pdf_text)
+        if tokens <= self.token_budget:
+            return pdf_text
+
+        chunks = chunk_text(pdf_text, self.chunk_tokens)
+        print(f"ℹ️ Paper is ~{tokens} tokens; condensing {len(chunks)} chunks before summarizing")
+
+        def summarize_chunk(chunk: str) -> str:
+            return chat_completion(
+                model=self.chunk_model,
+                temperature=0.2,
+                use_cache=self.use_llm_cache,
+                priority=BATCH,
+                messages=[
+                    {"role": "system", "content": (
+                        "You are condensing one part of a long academic paper so that it can be summarized later. "
+                        "Write dense plain-text notes covering the problem, motivation, method details, results, "
+                        "claims and stated limitations that appear in this part. "
+                        "Do not add information that is not in the text. DO NOT include LaTeX or math equations."
+                    )},
+                    {"role": "user", "content": chunk}
+                ]
+            )
+
+        outcome = fan_out(chunks, summarize_chunk, self.max_concurrency)
+        failures = outcome.failures()
+        if len(failures) == len(chunks):
+            raise failures[0][1]
+
+        # A failed part keeps its number and a truncated raw excerpt, so the reduce step sees the gap
+        parts = []
+        max_chars = self.fallback_tokens * CHARS_PER_TOKEN
+        for i, (chunk, note, error) in enumerate(zip(chunks, outcome.results, outcome.errors), 1):
+            if error is None:
+                parts.append(f"--- Part {i} ---\n{note}")
+                continue
+            print(f"❌ Failed to condense part {i} of {len(chunks)} of the paper, using a raw excerpt: {error}")
+            excerpt = truncate_at_sentence(chunk, max_chars) or chunk[:max_chars]
+            parts.append(f"--- Part {i} (notes unavailable; truncated raw excerpt) ---\n{excerpt}")
+        return "\n\n".join(parts)
+
+    def _summary_request(self, pdf_text: str) -> Dict:
+        return dict(
             model="gpt-4o",
             temperature=0.3,
+            use_cache=self.use_llm_cache,
             messages=[
                 {"role": "system", "content": (
                     "You are a scientific writing assistant helping summarize and analyze academic papers. "
@@ -111,48 +206,27 @@ class PSTool(Tool[None]):
             ]
         )
 
-        generated_content = response1.choices[0].message.content.strip()
-
-        # Parse into Notion blocks
-        section_blocks = []
-        section_heading_map = {
-            "intuitive understanding": "🧠 Intuitive Understanding",
-            "method breakdown": "⚙️ Method Breakdown",
-            "novelties / contributions": "🌟 Novelties / Contributions",
-            "critiques": "🧪 Critiques",
-            "related reading": "📚 Related Reading"
-        }
-
-        for line in generated_content.splitlines():
+    def summary_blocks_from_lines(self, lines: Iterable[str]) -> Iterator[dict]:
+        """Parses [[Section]]-delimited summary lines into Notion blocks, one line at a time."""
+        for line in lines:
             line = line.strip()
             if not line:
                 continue
             if line.startswith("[[") and line.endswith("]]"):
                 section_key = line[2:-2].strip().lower()
-                readable_title = section_heading_map.get(section_key, section_key.title())
-                section_blocks.append({
+                readable_title = self.section_heading_map.get(section_key, section_key.title())
+                yield {
                     "object": "block",
                     "type": "heading_2",
                     "heading_2": {
                         "rich_text": [{"type": "text", "text": {"content": readable_title}}]
                     }
-                })
+                }
             else:
-                section_blocks.append({
+                yield {
                     "object": "block",
                     "type": "paragraph",
                     "paragraph": {
                         "rich_text": [{"type": "text", "text": {"content": line}}]
                     }
-                })
-
-        blocks.extend(section_blocks)
-
-        response = notion.pages.create(
-                parent={"type": "page_id", "page_id": notion_parent_id},
-                properties={"title": [{"type": "text", "text": {"content": "Paper Summary"}}]},
-                children=blocks
-            )
-        
-    
-        return 
\ No newline at end of file
+                }
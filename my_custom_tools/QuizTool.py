@@ -6,14 +6,58 @@ import requests
 import xml.etree.ElementTree as ET
 from pydantic import BaseModel, Field
 from typing import Generic, TypeVar, List
-from notion_client import Client
+import json
 import os
-import openai
+from my_custom_tools.fanout import fan_out
+from my_custom_tools import notion_sync
+from my_custom_tools.notion_richtext import inline_math
+from my_custom_tools.llm import chat_completion
 import re
 
+def parse_quiz(content: str) -> List[Dict[str, str]]:
+    """
+    Parses "Question N: / Options: / Answer:" formatted text into quiz items.
+
+    Used for QuizTool's own responses and for the [[Quiz]] section of fused
+    lessons from NotionTool. Malformed questions are skipped.
+
+    Returns:
+        list[dict]: Up to 5 items with 'question', 'options' (4 strings) and 'answer' (A-D).
+    """
+    quiz_items = []
+    question_blocks = re.split(r'\n(?=Question \d+:)', content)
+
+    for block in question_blocks:
+        block = block.strip()
+        if not block:
+            continue
+        try:
+            q_match = re.match(r"Question \d+:\s*(.*?)\nOptions:", block, re.DOTALL)
+            options_match = re.search(r"Options:(.*?)Answer:", block, re.DOTALL)
+            a_match = re.search(r"Answer:\s*([ABCD])", block)
+
+            if not (q_match and options_match and a_match):
+                continue
+
+            question = q_match.group(1).strip()
+            raw_opts = options_match.group(1).strip().splitlines()
+            options = [opt[2:].strip() for opt in raw_opts if len(opt) > 2 and opt[1] == '.']
+
+            if len(options) == 4:
+                quiz_items.append({
+                    "question": question,
+                    "options": options,
+                    "answer": a_match.group(1)
+                })
+        except Exception:
+            continue
+
+    return quiz_items[:5]  # Ensure exactly 5 questions
+
+
 class QuizToolSchema(BaseModel): 
     """Input Schema for QuizTool."""
-    topics: List[Dict[str, str]] = Field(description="The list of topic pages, their IDs, and their page contents.")
+    topics: List[Dict[str, str]] = Field(description="The list of topic pages, their IDs, their page contents, if already generated, their quiz, and 'synced' when NotionTool reused existing pages.")
 
 class QuizTool(Tool[None]):
     """ Quiz Tool for creating quizzes for topics and creating separate pages for the quizzes. 
@@ -29,18 +73,29 @@ class QuizTool(Tool[None]):
         "Confirmation of Quiz Creation"
     )
 
+    # Reuse a cached quiz when the same lesson is quizzed again.
+    use_llm_cache: bool = True
+    # Number of topics quizzed at the same time.
+    max_concurrency: int = 4
+
     def run(self, context: ToolRunContext, topics: List[Dict[str, str]]) -> str: 
         """Creates a quiz for each topic and creates separate pages for the quizzes."""
-        for topic in topics: 
-            quiz = self.create_quiz(topic)
-            self.create_quiz_page(quiz, topic)
+        outcome = fan_out(topics, lambda topic: self.create_quiz_page(self.quiz_for(topic), topic, context.plan_run_id), self.max_concurrency)
+        failures = outcome.failures()
+        for topic, error in failures:
+            print(f"❌ Failed to create quiz for '{topic['topic']}': {error}")
+        if failures:
+            return f"Quizzes created for {len(topics) - len(failures)} of {len(topics)} topics."
         return "Quizzes created successfully!"
 
-    def create_quiz(self, topic: dict) -> List[Dict[str, str]]: 
-        client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def quiz_for(self, topic: dict) -> List[Dict[str, str]]:
+        """Returns the quiz NotionTool generated with the lesson, or creates one from the lesson content."""
+        if topic.get("quiz"):
+            return json.loads(topic["quiz"])
+        return self.create_quiz(topic)
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
+    def create_quiz(self, topic: dict) -> List[Dict[str, str]]: 
+        content = chat_completion(
             messages=[
                 {"role": "system", "content": (
                     "You are a tutor generating quiz questions from a lesson.\n"
@@ -57,90 +112,32 @@ class QuizTool(Tool[None]):
                 )},
                 {"role": "user", "content": f"Create a 5-question multiple choice quiz on the topic '{topic['topic']}' using this content: {topic['content']}"}
             ],
-            temperature=0.3
+            model="gpt-4o",
+            temperature=0.3,
+            use_cache=self.use_llm_cache,
         )
 
-        content = response.choices[0].message.content.strip()
-
-        quiz_items = []
-        question_blocks = re.split(r'\n(?=Question \d+:)', content)
-
-        for block in question_blocks:
-            block = block.strip()
-            if not block:
-                continue
-            try:
-                q_match = re.match(r"Question \d+:\s*(.*?)\nOptions:", block, re.DOTALL)
-                options_match = re.search(r"Options:(.*?)Answer:", block, re.DOTALL)
-                a_match = re.search(r"Answer:\s*([ABCD])", block)
-
-                if not (q_match and options_match and a_match):
-                    continue
-
-                question = q_match.group(1).strip()
-                raw_opts = options_match.group(1).strip().splitlines()
-                options = [opt[2:].strip() for opt in raw_opts if len(opt) > 2 and opt[1] == '.']
-
-                if len(options) == 4:
-                    quiz_items.append({
-                        "question": question,
-                        "options": options,
-                        "answer": a_match.group(1)
-                    })
-            except Exception:
-                continue
-
-        return quiz_items[:5]  # Ensure exactly 5 questions
+        return parse_quiz(content)
 
     def render_option_blocks(self, option_text: str, label: str, is_correct: bool = False):
         color = "green" if is_correct else "default"
         suffix = " ✅" if is_correct else ""
 
-        parts = []
-        pattern = r'(\\\(.*?\\\))'
-        last_end = 0
-        for match in re.finditer(pattern, option_text):
-            start, end = match.span()
-            if start > last_end:
-                parts.append({"type": "text", "text": {"content": option_text[last_end:start]}})
-            expression = match.group(1)[2:-2].strip()
-            parts.append({"type": "equation", "equation": {"expression": expression}})
-            last_end = end
-
-        if last_end < len(option_text):
-            parts.append({"type": "text", "text": {"content": option_text[last_end:] + suffix}})
-
         return {
             "object": "block",
             "type": "paragraph",
             "paragraph": {
                 "rich_text": [
                     {"type": "text", "text": {"content": f"{label}. "}, "annotations": {"bold": True, "color": color}},
-                    *parts
+                    *inline_math(option_text, suffix)
                 ]
             }
         }
 
     def render_question_title(self, text: str) -> List[Dict]:
-        parts = []
-        pattern = r'(\\\(.*?\\\))'
-        last_end = 0
-        for match in re.finditer(pattern, text):
-            start, end = match.span()
-            if start > last_end:
-                parts.append({"type": "text", "text": {"content": text[last_end:start]}})
-            expression = match.group(1)[2:-2].strip()
-            parts.append({"type": "equation", "equation": {"expression": expression}})
-            last_end = end
-        if last_end < len(text):
-            parts.append({"type": "text", "text": {"content": text[last_end:]}})
-        return parts
-
-    def create_quiz_page(self, quiz: List[Dict[str, str]], topic: dict) -> None:
-        notion_api_key = os.getenv("NOTION_API_KEY")
-        notion = Client(auth=notion_api_key)
-        parent_id = topic["page_id"]
+        return inline_math(text)
 
+    def create_quiz_page(self, quiz: List[Dict[str, str]], topic: dict, plan_run_id=None) -> None:
         blocks = []
         answer_blocks = []
         option_labels = ["A", "B", "C", "D"]
@@ -178,14 +175,7 @@ class QuizTool(Tool[None]):
             }
             blocks.append(input_block)
 
-        notion.pages.create(
-            parent={"type": "page_id", "page_id": parent_id},
-            properties={"title": [{"type": "text", "text": {"content": "📝 Quiz !"}}]},
-            children=blocks
-        )
-
-        notion.pages.create(
-            parent={"type": "page_id", "page_id": parent_id},
-            properties={"title": [{"type": "text", "text": {"content": "🎯 Quiz Solutions"}}]},
-            children=answer_blocks
-        )
\ No newline at end of file
+        notion_sync.publish_child_pages(topic, [
+            ("📝 Quiz !", blocks),
+            ("🎯 Quiz Solutions", answer_blocks),
+        ], plan_run_id)
@@ -1,18 +1,19 @@
 from dotenv import load_dotenv
 from portia.cli import CLIExecutionHooks
 from portia import *
-import requests
+from my_custom_tools import http_client
 import xml.etree.ElementTree as ET
 from pydantic import BaseModel, Field
 from typing import Generic, TypeVar, List, ClassVar, Dict, Literal
-from notion_client import Client
 import os
 from my_custom_tools.utils import truncate_at_sentence
+from my_custom_tools.fanout import fan_out
+from my_custom_tools import notion_sync
 
 class YouTubeToolSchema(BaseModel): 
 
     """Input Schema for YoutubeTool."""
-    topics: List[Dict[str, str]] = Field(description="The list of dictionaries (output from the NotionTool), each with 'topic', 'page_id' and 'content' keys.")
+    topics: List[Dict[str, str]] = Field(description="The list of dictionaries (output from the NotionTool), each with 'topic', 'page_id' and 'content' keys, plus 'synced' when NotionTool reused existing pages.")
 
 class YouTubeTool(Tool[None]):
 
@@ -27,6 +28,9 @@ class YouTubeTool(Tool[None]):
         "This tool does not return anything."
     )
 
+    # Number of topics searched and published at the same time.
+    max_concurrency: int = 4
+
     def run(self, context, topics: List[Dict[str, str]]) -> None:
         """Adds multiple YouTube video links to Notion pages for each topic."""
 
@@ -38,113 +42,116 @@ class YouTubeTool(Tool[None]):
         if not notion_api_key or not youtube_api_key:
             raise EnvironmentError("Missing NOTION_API_KEY or GOOGLE_API_KEY")
 
-        notion = Client(auth=notion_api_key)
-
-        for page in topics:
-            topic = page["topic"]
-            page_id = page["page_id"]
-            query = f"Explain {topic}"
-
-            url = (
-                f'https://www.googleapis.com/youtube/v3/search'
-                f'?part=snippet&type=video&q={query}'
-                f'&maxResults={max_results}&key={youtube_api_key}'
-            )
-
-            response = requests.get(url).json()
-            items = response.get("items", [])
-
-            if not items:
-                print(f"No videos found for topic: {topic}")
-                continue
-
-            video_blocks = []
-
-            # Add a heading before the videos
-            video_blocks.append({
-                "object": "block",
-                "type": "heading_2",
-                "heading_2": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {"content": "🎥 Recommended Videos"},
-                            "annotations": {"bold": True}
-                        }
-                    ]
-                }
-            })
-
-            for item in items:
-                video_id = item["id"]["videoId"]
-                title = item["snippet"]["title"]
-                description = item["snippet"]["description"]
-                channel = item["snippet"]["channelTitle"]
-                video_url = f"https://www.youtube.com/watch?v={video_id}"
-
-                video_blocks.extend([
-                    # Video title + link
+        outcome = fan_out(
+            topics,
+            lambda page: self.add_videos(page, youtube_api_key, max_results, context.plan_run_id),
+            self.max_concurrency,
+        )
+        for page, error in outcome.failures():
+            print(f"❌ Failed to add videos for '{page['topic']}': {error}")
+        return
+
+    def add_videos(self, page: Dict[str, str], youtube_api_key: str, max_results: int, plan_run_id=None) -> None:
+        """Searches YouTube for one topic and appends the video links to its Notion page."""
+        topic = page["topic"]
+        query = f"Explain {topic}"
+
+        url = (
+            f'https://www.googleapis.com/youtube/v3/search'
+            f'?part=snippet&type=video&q={query}'
+            f'&maxResults={max_results}&key={youtube_api_key}'
+        )
+
+        response = http_client.get(url).json()
+        items = response.get("items", [])
+
+        if not items:
+            print(f"No videos found for topic: {topic}")
+            return
+
+        video_blocks = []
+
+        # Add a heading before the videos
+        video_blocks.append({
+            "object": "block",
+            "type": "heading_2",
+            "heading_2": {
+                "rich_text": [
                     {
-                        "object": "block",
-                        "type": "paragraph",
-                        "paragraph": {
-                            "rich_text": [
-                                {
-                                    "type": "text",
-                                    "text": {
-                                        "content": f"▶ {title} by {channel} – ",
-                                        "link": {"url": video_url}
-                                    },
-                                    "annotations": {
-                                        "bold": True,
-                                        "color": "blue"
-                                    }
+                        "type": "text",
+                        "text": {"content": "🎥 Recommended Videos"},
+                        "annotations": {"bold": True}
+                    }
+                ]
+            }
+        })
+
+        for item in items:
+            video_id = item["id"]["videoId"]
+            title = item["snippet"]["title"]
+            description = item["snippet"]["description"]
+            channel = item["snippet"]["channelTitle"]
+            video_url = f"https://www.youtube.com/watch?v={video_id}"
+
+            video_blocks.extend([
+                # Video title + link
+                {
+                    "object": "block",
+                    "type": "paragraph",
+                    "paragraph": {
+                        "rich_text": [
+                            {
+                                "type": "text",
+                                "text": {
+                                    "content": f"▶ {title} by {channel} – ",
+                                    "link": {"url": video_url}
                                 },
-                                {
-                                    "type": "text",
-                                    "text": {
-                                        "content": "Watch",
-                                        "link": {"url": video_url}
-                                    },
-                                    "annotations": {
-                                        "italic": True,
-                                        "color": "blue"
-                                    }
+                                "annotations": {
+                                    "bold": True,
+                                    "color": "blue"
                                 }
-                            ]
-                        }
-                    },
-                    # Short description
-                    {
-                        "object": "block",
-                        "type": "quote",
-                        "quote": {
-                            "rich_text": [
-                                {
-                                    "type": "text",
-                                    "text": {
-                                        "content": truncate_at_sentence(description, 300) + "...",
-                                    },
-                                    "annotations": {
-                                        "color": "gray"
-                                    }
+                            },
+                            {
+                                "type": "text",
+                                "text": {
+                                    "content": "Watch",
+                                    "link": {"url": video_url}
+                                },
+                                "annotations": {
+                                    "italic": True,
+                                    "color": "blue"
                                 }
-                            ]
-                        }
-                    },
-                    # Spacer block (optional)
-                    {
-                        "object": "block",
-                        "type": "paragraph",
-                        "paragraph": {
-                            "rich_text": []
-                        }
+                            }
+                        ]
+                    }
+                },
+                # Short description
+                {
+                    "object": "block",
+                    "type": "quote",
+                    "quote": {
+                        "rich_text": [
+                            {
+                                "type": "text",
+                                "text": {
+                                    "content": truncate_at_sentence(description, 300) + "...",
+                                },
+                                "annotations": {
+                                    "color": "gray"
+                                }
+                            }
+                        ]
                     }
-                ])
-
-            # Append everything to the Notion page
-            notion.blocks.children.append(
-                block_id=page_id,
-                children=video_blocks
-            )
-        return 
\ No newline at end of file
+                },
+                # Spacer block (optional)
+                {
+                    "object": "block",
+                    "type": "paragraph",
+                    "paragraph": {
+                        "rich_text": []
+                    }
+                }
+            ])
+
+        # Append everything to the Notion page
+        notion_sync.publish_section(page, "videos", video_blocks, plan_run_id)
@@ -1,7 +1,7 @@
 from dotenv import load_dotenv
 from portia.cli import CLIExecutionHooks
 from portia import *
-import requests
+from my_custom_tools import http_client
 import xml.etree.ElementTree as ET
 from pydantic import BaseModel, Field
 from typing import Generic, TypeVar, List, ClassVar, Dict
@@ -23,12 +23,10 @@ class ArXivTool(Tool[List[Dict[str, str]]]):
         "A list of dictionaries containing paper data like title, authors, and pdf_url"
     )
 
-    def run(self, context: ToolRunContext, topic: str) -> List[Dict[str, str]]:
     def run(self, context: ToolRunContext, topic: str) -> List[Dict[str, str]]:
         
         """Run the arXiv Tool."""
         max_results = 1
-        max_results = 1
         base_url = "http://export.arxiv.org/api/query"
         params = {
             "search_query": f"all:{topic}",
@@ -38,7 +36,8 @@ class ArXivTool(Tool[List[Dict[str, str]]]):
             "sortOrder": "descending"
         }
 
-        response = requests.get(base_url, params=params)
+        response = http_client.get(base_url, params=params)
+        response.raise_for_status()
         root = ET.fromstring(response.text)
 
         ns = {'atom': 'http://www.w3.org/2005/Atom'}
@@ -0,0 +1,73 @@
+"""Token estimates and page-aware chunking of extracted paper text."""
+
+import re
+from typing import Iterable, Iterator, List, Sized
+
+# Rough characters-per-token ratio for English prose with OpenAI tokenizers.
+CHARS_PER_TOKEN = 4
+# Estimated tokens of paper text the summary request takes whole. PDFReaderTool compresses papers to
+# this size and PSTool condenses anything above it, so by default a paper goes through only one of the two.
+PAPER_TOKEN_BUDGET = 24000
+
+_PAGE_MARKER = re.compile(r"\s*(?=--- Page \d+ ---)")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: Sized) -> int:
+    """Cheap token estimate (characters / 4), good enough for budgeting prompts."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def split_pages(text: str) -> List[str]:
+    """Splits PDFReaderTool output on its '--- Page N ---' markers, keeping each marker with its page."""
+    return [page for page in _PAGE_MARKER.split(text) if page.strip()]
+
+
+def iter_pages(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    `split_pages` for text that arrives in chunks (such as a SpooledText from
+    PDFReaderTool), yielding each page as soon as the next marker is seen.
+    """
+    buffer = ""
+    for chunk in chunks:
+        pages = _PAGE_MARKER.split(buffer + chunk)
+        # The last page may continue, or end in a partial marker, in the next chunk.
+        buffer = pages.pop()
+        yield from (page for page in pages if page.strip())
+    if buffer.strip():
+        yield buffer
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """
+    Groups whole pages into chunks of at most `max_tokens` estimated tokens.
+
+    Pages larger than the budget are split at sentence boundaries, and a single
+    sentence larger than the budget is cut at the character limit.
+
+    Args:
+        text (str): Extracted paper text, as produced by PDFReaderTool.
+        max_tokens (int): Token budget per chunk.
+
+    Returns:
+        list[str]: The chunks, in reading order.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for page in split_pages(text):
+        if len(page) <= max_chars:
+            pieces.append(page)
+            continue
+        for sentence in _SENTENCE_END.split(page):
+            pieces.extend(sentence[i:i + max_chars] for i in range(0, len(sentence), max_chars))
+
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 1 + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,145 @@
+"""Small on-disk key/value cache with compression, TTL and LRU eviction.
+
+Each entry is one zlib-compressed file named after its key. A file's mtime
+is bumped on every hit, so evicting the oldest mtimes first gives LRU order.
+The creation time is stored in a short header so entries can also expire.
+"""
+
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+_HEADER = struct.Struct("<d")  # creation timestamp
+# Bytes of compressed data read at a time by `get_into`.
+_READ_SIZE = 256 * 1024
+
+
+class DiskCache:
+    """Thread-safe cache of bytes values keyed by hex digests."""
+
+    def __init__(self, directory: Path, max_bytes: int, ttl: Optional[float] = None):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._size = sum(path.stat().st_size for path in self._entries())
+
+    def _entries(self):
+        return (path for path in self.directory.glob("*/*") if path.suffix == ".z")
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.z"
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Returns the cached value, or None on a miss or an expired entry."""
+        parts = []
+        return b"".join(parts) if self.get_into(key, parts.append) else None
+
+    def get_into(self, key: str, write: Callable[[bytes], None]) -> bool:
+        """
+        Streams the cached value into `write` in decompressed chunks, so a large
+        value is never held whole. Returns False on a miss or an expired entry;
+        a corrupt entry can fail after some chunks were written.
+        """
+        path = self._path(key)
+        found = False
+        try:
+            with open(path, "rb") as f:
+                (created,) = _HEADER.unpack(f.read(_HEADER.size))
+                if self.ttl is not None and time.time() - created > self.ttl:
+                    expired = True
+                else:
+                    expired = False
+                    decompressor = zlib.decompressobj()
+                    for data in iter(lambda: f.read(_READ_SIZE), b""):
+                        write(decompressor.decompress(data))
+                    write(decompressor.flush())
+                    if not decompressor.eof:
+                        raise zlib.error("truncated entry")
+            if expired:
+                self._remove(path)
+            else:
+                os.utime(path)
+                found = True
+        except (OSError, struct.error, zlib.error):
+            found = False
+
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return found
+
+    def set(self, key: str, value: bytes) -> None:
+        """Stores `value` under `key`, then evicts old entries if over budget."""
+        self.set_chunks(key, (value,))
+
+    def set_chunks(self, key: str, chunks: Iterable[bytes]) -> None:
+        """Stores the concatenated `chunks` under `key`, compressing them as they arrive."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        compressor = zlib.compressobj()
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(time.time()))
+                for chunk in chunks:
+                    f.write(compressor.compress(chunk))
+                f.write(compressor.flush())
+                size = f.tell()
+            old_size = path.stat().st_size if path.exists() else 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            self._size += size - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _remove(self, path: Path) -> None:
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self._size -= size
+
+    def _evict(self) -> None:
+        """Deletes least recently used entries until the cache fits. Caller holds the lock."""
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            self._size -= size
+
+    def stats(self) -> Dict[str, float]:
+        """Returns hit/miss counters and the current hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bytes": self._size,
+            }
@@ -0,0 +1,48 @@
+"""Concurrent per-topic execution shared by the Notion-facing tools."""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class FanOutResult(NamedTuple):
+    """Per-item results and errors, both aligned with the input items."""
+    items: Sequence[Any]
+    results: List[Any]
+    errors: List[Optional[Exception]]
+
+    def succeeded(self) -> List[Any]:
+        """Results of the items that did not fail, in input order."""
+        return [result for result, error in zip(self.results, self.errors) if error is None]
+
+    def failures(self) -> List[Tuple[Any, Exception]]:
+        """(item, error) for every item that raised, in input order."""
+        return [(item, error) for item, error in zip(self.items, self.errors) if error is not None]
+
+
+def fan_out(items: Sequence[Any], func: Callable[[Any], Any], max_workers: int = 4) -> FanOutResult:
+    """
+    Calls `func` on every item concurrently, collecting failures instead of raising.
+
+    Args:
+        items (Sequence): The work items, e.g. topics.
+        func (Callable): Called once per item on a worker thread.
+        max_workers (int, optional): Maximum number of items in flight. Defaults to 4.
+
+    Returns:
+        FanOutResult: Per-item results and errors in the same order as `items`.
+    """
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as e:
+            return None, e
+
+    workers = max(1, min(max_workers, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        outcomes = list(pool.map(call, items))
+
+    return FanOutResult(
+        items=items,
+        results=[result for result, _ in outcomes],
+        errors=[error for _, error in outcomes],
+    )
@@ -0,0 +1,132 @@
+"""Shared HTTP session used by every tool that talks to the network.
+
+All outgoing requests go through one pooled ``requests.Session`` so that
+connections (and their TLS handshakes) are reused across tools, every request
+gets a connect/read timeout, transient failures are retried with jittered
+exponential backoff, and each host is rate limited with a token bucket.
+"""
+
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) timeouts in seconds applied when the caller does not pass one.
+DEFAULT_TIMEOUT: Tuple[float, float] = (5.0, 30.0)
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 10.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Host -> (requests per second, burst size). arXiv asks for 1 request every 3 s.
+HOST_RATE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "export.arxiv.org": (1 / 3, 1),
+    "arxiv.org": (1 / 3, 1),
+    "en.wikipedia.org": (10.0, 10),
+    "www.googleapis.com": (5.0, 5),
+}
+DEFAULT_RATE_LIMIT: Tuple[float, int] = (10.0, 10)
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire`` blocks until a token is available."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_session: Optional[requests.Session] = None
+_buckets: Dict[str, TokenBucket] = {}
+_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Returns the process-wide session, creating it on first use."""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _bucket_for(host: str) -> TokenBucket:
+    with _lock:
+        bucket = _buckets.get(host)
+        if bucket is None:
+            rate, capacity = HOST_RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT)
+            bucket = _buckets[host] = TokenBucket(rate, capacity)
+        return bucket
+
+
+def _backoff(attempt: int, retry_after: Optional[str] = None) -> None:
+    """Sleeps before the next attempt, honouring a numeric Retry-After header."""
+    if retry_after and retry_after.isdigit():
+        delay = min(float(retry_after), BACKOFF_CAP)
+    else:
+        delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    time.sleep(delay)
+
+
+def request(method: str, url: str, *, retries: int = MAX_RETRIES, **kwargs) -> requests.Response:
+    """
+    Sends a request through the shared session.
+
+    Args:
+        method (str): HTTP method, e.g. "GET".
+        url (str): Absolute URL to request.
+        retries (int, optional): Retries after the first attempt. Defaults to MAX_RETRIES.
+        **kwargs: Passed through to ``requests.Session.request``.
+
+    Returns:
+        requests.Response: The final response (which may still be an error status).
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    session = get_session()
+    bucket = _bucket_for(urlsplit(url).hostname or "")
+
+    for attempt in range(retries + 1):
+        bucket.acquire()
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+            _backoff(attempt)
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            retry_after = response.headers.get("Retry-After")
+            response.close()
+            _backoff(attempt, retry_after)
+            continue
+        return response
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """Sends a GET request through the shared session."""
+    return request("GET", url, **kwargs)
@@ -0,0 +1,40 @@
+"""Incremental line splitting for streamed LLM output."""
+
+from typing import Iterable, Iterator, List
+
+
+class LineStream:
+    """
+    Splits streamed text deltas into lines, yielding each line as soon as it ends.
+
+    Lines match ``str.splitlines()`` on the full text, except that a "\\r\\n" split
+    across two deltas yields an extra empty line; the section parsers skip blank
+    lines anyway. Once iterated, `text` holds the full stripped response.
+    """
+
+    def __init__(self, deltas: Iterable[str]):
+        self._deltas = deltas
+        self._parts: List[str] = []
+
+    def __iter__(self) -> Iterator[str]:
+        buffer = ""
+        for delta in self._deltas:
+            self._parts.append(delta)
+            buffer += delta
+            lines = buffer.splitlines(keepends=True)
+            buffer = ""
+            if lines and not _ends_line(lines[-1]):
+                buffer = lines.pop()
+            for line in lines:
+                yield line.splitlines()[0]
+        if buffer:
+            yield buffer
+
+    @property
+    def text(self) -> str:
+        """Everything received so far, stripped like a non-streamed response."""
+        return "".join(self._parts).strip()
+
+
+def _ends_line(text: str) -> bool:
+    return text.splitlines()[0] != text
@@ -0,0 +1,224 @@
+"""LLM calls shared by the tools, with a persistent response cache.
+
+Responses are cached on disk, keyed by (provider, model, full message list,
+temperature), so asking for the same lesson, summary or quiz again costs no
+round-trip. Entries expire after LLM_CACHE_TTL seconds and the cache is
+size-bounded with LRU eviction. Pass ``use_cache=False`` to bypass it.
+
+Cache misses go through the process-wide scheduler in llm_scheduler, which
+enforces per-provider request/token budgets and priorities, and reuse one
+client per provider.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+import google.generativeai as genai
+import openai
+
+from my_custom_tools.chunking import estimate_tokens
+from my_custom_tools.disk_cache import DiskCache
+from my_custom_tools.llm_scheduler import INTERACTIVE, get_scheduler
+
+DEFAULT_LLM_CACHE_DIR = Path.home() / ".cache" / "explain" / "llm_cache"
+DEFAULT_LLM_CACHE_MAX_BYTES = 256 * 1024 ** 2
+DEFAULT_LLM_CACHE_TTL = 30 * 24 * 3600
+
+# Completion tokens assumed per call when reserving the tokens-per-minute budget.
+OUTPUT_TOKEN_ESTIMATE = 1500
+
+_cache: Optional[DiskCache] = None
+_cache_lock = threading.Lock()
+_openai_client: Optional[openai.OpenAI] = None
+_gemini_models: Dict[tuple, genai.GenerativeModel] = {}
+_client_lock = threading.Lock()
+
+
+def get_llm_cache() -> DiskCache:
+    """Returns the process-wide response cache (LLM_CACHE_DIR / LLM_CACHE_MAX_BYTES / LLM_CACHE_TTL)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            directory = Path(os.getenv("LLM_CACHE_DIR", DEFAULT_LLM_CACHE_DIR))
+            max_bytes = int(os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_LLM_CACHE_MAX_BYTES))
+            ttl = float(os.getenv("LLM_CACHE_TTL", DEFAULT_LLM_CACHE_TTL))
+            _cache = DiskCache(directory, max_bytes, ttl=ttl)
+        return _cache
+
+
+def cache_key(provider: str, model: str, messages: List[Dict[str, str]], temperature: float) -> str:
+    """Hashes everything that determines a completion into a cache key."""
+    payload = json.dumps([provider, model, messages, temperature], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def llm_cache_stats() -> Dict[str, float]:
+    """Hit/miss counters of the response cache for this process."""
+    return get_llm_cache().stats()
+
+
+def openai_client() -> openai.OpenAI:
+    """Returns the shared OpenAI client. Its own retries are off; the scheduler retries 429s and transient errors."""
+    global _openai_client
+    with _client_lock:
+        if _openai_client is None:
+            _openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        return _openai_client
+
+
+def gemini_model(model: str, temperature: float) -> genai.GenerativeModel:
+    """Returns a shared Gemini model handle for (model, temperature)."""
+    with _client_lock:
+        handle = _gemini_models.get((model, temperature))
+        if handle is None:
+            if not _gemini_models:
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            handle = _gemini_models[(model, temperature)] = genai.GenerativeModel(
+                model_name=model,
+                generation_config=genai.types.GenerationConfig(temperature=temperature),
+            )
+        return handle
+
+
+def _budget(messages: List[Dict[str, str]]) -> int:
+    return sum(estimate_tokens(message["content"]) for message in messages) + OUTPUT_TOKEN_ESTIMATE
+
+
+def _cached(key: str, use_cache: bool, generate) -> str:
+    cache = get_llm_cache()
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached.decode("utf-8")
+    content = generate()
+    if use_cache:
+        cache.set(key, content.encode("utf-8"))
+    return content
+
+
+def _cached_stream(key: str, use_cache: bool, stream: Callable[[], Iterator[str]]) -> Iterator[str]:
+    """Yields a cached response in one piece, or streams a fresh one and caches it once complete."""
+    cache = get_llm_cache()
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached.decode("utf-8")
+            return
+    parts = []
+    for delta in stream():
+        parts.append(delta)
+        yield delta
+    if use_cache:
+        cache.set(key, "".join(parts).strip().encode("utf-8"))
+
+
+def chat_completion(
+    messages: List[Dict[str, str]],
+    model: str = "gpt-4o",
+    temperature: float = 0.3,
+    use_cache: bool = True,
+    priority: int = INTERACTIVE,
+) -> str:
+    """
+    Runs an OpenAI chat completion and returns the stripped message content.
+
+    Args:
+        messages (list[dict]): Chat messages with 'role' and 'content'.
+        model (str, optional): OpenAI model name. Defaults to "gpt-4o".
+        temperature (float, optional): Sampling temperature. Defaults to 0.3.
+        use_cache (bool, optional): Read and write the response cache. Defaults to True.
+        priority (int, optional): Scheduler priority class, INTERACTIVE or BATCH. Defaults to INTERACTIVE.
+
+    Returns:
+        str: The completion text.
+    """
+    def call() -> str:
+        response = openai_client().chat.completions.create(model=model, messages=messages, temperature=temperature)
+        return response.choices[0].message.content.strip()
+
+    def generate() -> str:
+        return get_scheduler().run("openai", call, priority=priority, tokens=_budget(messages))
+
+    return _cached(cache_key("openai", model, messages, temperature), use_cache, generate)
+
+
+def gemini_generate(
+    prompt: str,
+    model: str = "gemini-2.0-flash",
+    temperature: float = 0.2,
+    use_cache: bool = True,
+    priority: int = INTERACTIVE,
+) -> str:
+    """
+    Runs a single-prompt Gemini generation and returns the stripped text.
+
+    Args:
+        prompt (str): The full prompt.
+        model (str, optional): Gemini model name. Defaults to "gemini-2.0-flash".
+        temperature (float, optional): Sampling temperature. Defaults to 0.2.
+        use_cache (bool, optional): Read and write the response cache. Defaults to True.
+        priority (int, optional): Scheduler priority class, INTERACTIVE or BATCH. Defaults to INTERACTIVE.
+
+    Returns:
+        str: The generated text.
+    """
+    def call() -> str:
+        return gemini_model(model, temperature).generate_content(prompt).text.strip()
+
+    messages = [{"role": "user", "content": prompt}]
+
+    def generate() -> str:
+        return get_scheduler().run("gemini", call, priority=priority, tokens=_budget(messages))
+
+    return _cached(cache_key("gemini", model, messages, temperature), use_cache, generate)
+
+
+def stream_chat_completion(
+    messages: List[Dict[str, str]],
+    model: str = "gpt-4o",
+    temperature: float = 0.3,
+    use_cache: bool = True,
+    priority: int = INTERACTIVE,
+) -> Iterator[str]:
+    """
+    Streams an OpenAI chat completion as text deltas.
+
+    Shares cache entries with `chat_completion`: a cached response is yielded as a
+    single delta, and a fresh one is cached after the stream is fully consumed.
+    """
+    def open_stream() -> Iterator[str]:
+        chunks = openai_client().chat.completions.create(
+            model=model, messages=messages, temperature=temperature, stream=True
+        )
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def stream() -> Iterator[str]:
+        return get_scheduler().stream("openai", open_stream, priority=priority, tokens=_budget(messages))
+
+    return _cached_stream(cache_key("openai", model, messages, temperature), use_cache, stream)
+
+
+def stream_gemini_generate(
+    prompt: str,
+    model: str = "gemini-2.0-flash",
+    temperature: float = 0.2,
+    use_cache: bool = True,
+    priority: int = INTERACTIVE,
+) -> Iterator[str]:
+    """Streams a Gemini generation as text deltas, sharing cache entries with `gemini_generate`."""
+    def open_stream() -> Iterator[str]:
+        for chunk in gemini_model(model, temperature).generate_content(prompt, stream=True):
+            if chunk.text:
+                yield chunk.text
+
+    messages = [{"role": "user", "content": prompt}]
+
+    def stream() -> Iterator[str]:
+        return get_scheduler().stream("gemini", open_stream, priority=priority, tokens=_budget(messages))
+    return _cached_stream(cache_key("gemini", model, messages, temperature), use_cache, stream)
@@ -0,0 +1,209 @@
+"""Process-wide scheduler that every LLM call goes through.
+
+Each provider gets a request bucket (RPM) and a token bucket (TPM), both
+``TokenBucket``s like the per-host HTTP limits, plus a concurrency limit that
+adapts itself: it halves whenever the provider answers 429 and creeps back up
+by one slot per window of successful calls (AIMD). Callers waiting for a slot
+are served by priority class first, then in arrival order, so interactive
+work (lessons, quizzes) runs ahead of batch work (chunk condensing). A call
+that is rate limited is retried with jittered exponential backoff, so bursts
+settle near the account's limit instead of turning into retry storms. Timeouts,
+connection errors and 408/409/5xx answers are retried the same way (as the
+SDKs' own retries, which are turned off, used to do) but leave the
+concurrency limit alone.
+"""
+
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterator, NamedTuple, Optional, TypeVar
+
+from my_custom_tools.http_client import BACKOFF_BASE, BACKOFF_CAP, TokenBucket
+
+T = TypeVar("T")
+
+INTERACTIVE = 0
+BATCH = 1
+
+MAX_RETRIES = 4
+
+TRANSIENT_STATUSES = {408, 409, 500, 502, 503, 504}
+# Exception classes (matched by name along the MRO) for requests that never got an answer.
+TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "ConnectionError", "TimeoutError", "DeadlineExceeded"}
+
+
+class ProviderLimits(NamedTuple):
+    """Account limits of one provider."""
+    requests_per_minute: float
+    tokens_per_minute: float
+    max_concurrency: int
+
+
+# Conservative defaults (OpenAI tier 1 for gpt-4o, Gemini Flash pay-as-you-go);
+# override with OPENAI_RPM / OPENAI_TPM / GEMINI_RPM / GEMINI_TPM.
+DEFAULT_LIMITS: Dict[str, ProviderLimits] = {
+    "openai": ProviderLimits(500, 30_000, 8),
+    "gemini": ProviderLimits(60, 1_000_000, 8),
+}
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    """True for provider 429s (openai.RateLimitError, google ResourceExhausted)."""
+    return getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429
+
+
+def _is_transient(error: Exception) -> bool:
+    """True for timeouts, dropped connections and 408/409/5xx answers, which are worth retrying."""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status in TRANSIENT_STATUSES:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+def _backoff(attempt: int) -> None:
+    time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt + 1))))
+
+
+class _ProviderQueue:
+    """Budgets, adaptive concurrency limit and priority wait queue of one provider."""
+
+    def __init__(self, limits: ProviderLimits):
+        self.limits = limits
+        rpm, tpm = limits.requests_per_minute, limits.tokens_per_minute
+        self.requests = TokenBucket(rpm / 60, max(1, int(rpm // 6)))
+        self.tokens = TokenBucket(tpm / 60, int(tpm))
+        self.limit = float(max(1, limits.max_concurrency // 2))
+        self.active = 0
+        self.calls = 0
+        self.rate_limited = 0
+        self._waiting = []
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+
+    def acquire(self, priority: int, tokens: int) -> None:
+        ticket = (priority, next(self._tickets))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while self._waiting[0] != ticket or self.active >= int(self.limit):
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self.active += 1
+            self._cond.notify_all()
+        self.requests.acquire()
+        self.tokens.acquire(min(tokens, self.tokens.capacity))
+
+    def release(self, rate_limited: bool = False, succeeded: bool = True) -> None:
+        with self._cond:
+            self.active -= 1
+            self.calls += 1
+            if rate_limited:
+                self.rate_limited += 1
+                self.limit = max(1.0, self.limit / 2)
+            elif succeeded:
+                self.limit = min(float(self.limits.max_concurrency), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class LLMScheduler:
+    """Runs LLM calls under per-provider budgets, priorities and adaptive concurrency."""
+
+    def __init__(self, limits: Dict[str, ProviderLimits]):
+        self._queues = {provider: _ProviderQueue(provider_limits) for provider, provider_limits in limits.items()}
+
+    def run(self, provider: str, call: Callable[[], T], *, priority: int = INTERACTIVE, tokens: int = 0) -> T:
+        """
+        Runs `call` once a slot and budget are available, retrying it on 429s and transient errors.
+
+        Args:
+            provider (str): "openai" or "gemini".
+            call (Callable): Performs the request and returns its result.
+            priority (int, optional): INTERACTIVE or BATCH. Defaults to INTERACTIVE.
+            tokens (int, optional): Estimated tokens the call consumes. Defaults to 0.
+
+        Returns:
+            The result of `call`.
+        """
+        queue = self._queues[provider]
+        for attempt in range(MAX_RETRIES + 1):
+            queue.acquire(priority, tokens)
+            try:
+                result = call()
+            except Exception as e:
+                rate_limited = _is_rate_limited(e)
+                queue.release(rate_limited=rate_limited, succeeded=False)
+                if not (rate_limited or _is_transient(e)) or attempt == MAX_RETRIES:
+                    raise
+                _backoff(attempt)
+                continue
+            queue.release()
+            return result
+
+    def stream(
+        self, provider: str, open_stream: Callable[[], Iterator[str]], *, priority: int = INTERACTIVE, tokens: int = 0
+    ) -> Iterator[str]:
+        """
+        Like `run` for streamed responses; the slot is held until the stream ends.
+
+        A 429 or transient error is only retried if it arrives before the first delta was yielded.
+        """
+        queue = self._queues[provider]
+        for attempt in range(MAX_RETRIES + 1):
+            queue.acquire(priority, tokens)
+            started = False
+            try:
+                for delta in open_stream():
+                    started = True
+                    yield delta
+            except Exception as e:
+                rate_limited = _is_rate_limited(e)
+                queue.release(rate_limited=rate_limited, succeeded=False)
+                if not (rate_limited or _is_transient(e)) or started or attempt == MAX_RETRIES:
+                    raise
+                _backoff(attempt)
+                continue
+            except BaseException:
+                # Generator closed early (GeneratorExit) or interrupted.
+                queue.release(succeeded=False)
+                raise
+            queue.release()
+            return
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-provider concurrency limit, calls in flight, completed calls and 429 count."""
+        return {
+            provider: {
+                "limit": int(queue.limit),
+                "active": queue.active,
+                "calls": queue.calls,
+                "rate_limited": queue.rate_limited,
+            }
+            for provider, queue in self._queues.items()
+        }
+
+
+def _limits_from_env() -> Dict[str, ProviderLimits]:
+    limits = {}
+    for provider, defaults in DEFAULT_LIMITS.items():
+        prefix = provider.upper()
+        limits[provider] = ProviderLimits(
+            float(os.getenv(f"{prefix}_RPM", defaults.requests_per_minute)),
+            float(os.getenv(f"{prefix}_TPM", defaults.tokens_per_minute)),
+            int(os.getenv(f"{prefix}_MAX_CONCURRENCY", defaults.max_concurrency)),
+        )
+    return limits
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Returns the process-wide scheduler, configured from the environment on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(_limits_from_env())
+        return _scheduler
@@ -0,0 +1,175 @@
+"""Write-ahead journal of Notion writes.
+
+Every Notion write made on behalf of a plan run is recorded in a local SQLite
+journal, with its full payload and an idempotency key, before it is sent, and
+marked as sent (with the resulting page ID) once Notion accepts it. If a run
+dies partway through publishing, the unsent writes can be replayed without
+redoing any LLM work:
+
+    python -m my_custom_tools.notion_journal status <plan_run_id>
+    python -m my_custom_tools.notion_journal resume <plan_run_id>
+
+Writes whose target is a page created earlier in the same run refer to it as
+"@<key of the create>", and are resolved to the real page ID at send time.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+DEFAULT_JOURNAL_PATH = Path.home() / ".cache" / "explain" / "notion_journal.sqlite3"
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+
+class JournalEntry(NamedTuple):
+    """One journaled Notion write."""
+    key: str
+    run_id: str
+    op: str
+    target: str
+    payload: Dict[str, Any]
+    status: str
+    result: Optional[str]
+    error: Optional[str]
+
+
+class NotionJournal:
+    """SQLite journal of Notion writes keyed by idempotency key."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS writes ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT UNIQUE NOT NULL, run_id TEXT NOT NULL, "
+                "op TEXT NOT NULL, target TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+                "result TEXT, error TEXT, updated REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS writes_run ON writes (run_id, seq)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def idempotency_key(run_id: str, op: str, target: str, payload: Dict[str, Any]) -> str:
+        """Same run, operation, target and payload always give the same key."""
+        data = json.dumps([run_id, op, target, payload], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def record(self, run_id, op: str, target: str, payload: Dict[str, Any]) -> str:
+        """
+        Journals a write as pending, unless the same write is already journaled.
+
+        Args:
+            run_id: The plan run the write belongs to.
+            op (str): "create_page", "append" or "update_page".
+            target (str): Parent or page ID, or "@<key>" of a page created in this run.
+            payload (dict): Everything else needed to send the write.
+
+        Returns:
+            str: The write's idempotency key.
+        """
+        run_id = str(run_id)
+        key = self.idempotency_key(run_id, op, target, payload)
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO writes (key, run_id, op, target, payload, status, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, run_id, op, target, json.dumps(payload, ensure_ascii=False), PENDING, time.time()),
+            )
+        return key
+
+    def _entry(self, row) -> JournalEntry:
+        key, run_id, op, target, payload, status, result, error = row
+        return JournalEntry(key, run_id, op, target, json.loads(payload), status, result, error)
+
+    def get(self, key: str) -> Optional[JournalEntry]:
+        with self._lock, closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT key, run_id, op, target, payload, status, result, error FROM writes WHERE key = ?", (key,)
+            ).fetchone()
+        return self._entry(row) if row else None
+
+    def entries(self, run_id, unsent_only: bool = False) -> List[JournalEntry]:
+        """A run's writes in the order they were journaled."""
+        query = "SELECT key, run_id, op, target, payload, status, result, error FROM writes WHERE run_id = ?"
+        if unsent_only:
+            query += f" AND status != '{SENT}'"
+        with self._lock, closing(self._connect()) as conn:
+            rows = conn.execute(query + " ORDER BY seq", (str(run_id),)).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def _set_status(self, key: str, status: str, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE writes SET status = ?, result = COALESCE(?, result), error = ?, updated = ? WHERE key = ?",
+                (status, result, error, time.time(), key),
+            )
+
+    def mark_sent(self, key: str, result: Optional[str] = None) -> None:
+        self._set_status(key, SENT, result=result)
+
+    def mark_failed(self, key: str, error: Exception) -> None:
+        self._set_status(key, FAILED, error=str(error))
+
+    def forget(self, run_id) -> None:
+        """Drops all of a run's entries, once nothing is left to resume."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM writes WHERE run_id = ?", (str(run_id),))
+
+    def resolve(self, target: str) -> str:
+        """Turns "@<key>" into the page ID that write produced; raises if it was never sent."""
+        if not target.startswith("@"):
+            return target
+        entry = self.get(target[1:])
+        if entry is None or entry.status != SENT or not entry.result:
+            raise RuntimeError(f"Page from write {target[1:12]} has not been created yet")
+        return entry.result
+
+
+_journal: Optional[NotionJournal] = None
+_journal_lock = threading.Lock()
+
+
+def get_journal() -> NotionJournal:
+    """Returns the process-wide journal (NOTION_JOURNAL_PATH overrides its location)."""
+    global _journal
+    with _journal_lock:
+        if _journal is None:
+            _journal = NotionJournal(Path(os.getenv("NOTION_JOURNAL_PATH", DEFAULT_JOURNAL_PATH)))
+        return _journal
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) != 2 or argv[0] not in {"status", "resume"}:
+        print("Usage: python -m my_custom_tools.notion_journal {status|resume} <plan_run_id>")
+        return 2
+    command, run_id = argv
+    if command == "status":
+        entries = get_journal().entries(run_id)
+        for status in (SENT, PENDING, FAILED):
+            print(f"{status}: {sum(entry.status == status for entry in entries)}")
+        for entry in entries:
+            if entry.status == FAILED:
+                print(f"❌ {entry.op} {entry.target}: {entry.error}")
+        return 0
+
+    # Imported here: the writer itself journals through this module.
+    from my_custom_tools.notion_writer import resume_run
+    return 0 if resume_run(run_id) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
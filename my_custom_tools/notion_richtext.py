@@ -0,0 +1,124 @@
+"""Compiles the markdown and inline LaTeX of lesson and quiz text into Notion rich text.
+
+Both tokenizers are compiled once at import. Their results are memoized as
+immutable run specs keyed by the input text, so the fragments that repeat
+(quiz options rendered for the quiz and again for the solutions page,
+identical lines across lessons) are tokenized once, and every call still gets
+fresh dicts it may modify. Text runs longer than Notion's 2000-character
+limit are split into consecutive runs with the same styling.
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# Notion's limit on the content of one rich-text run.
+MAX_TEXT_LENGTH = 2000
+# Distinct fragments remembered per tokenizer.
+MEMO_SIZE = 4096
+
+# **bold**, _italic_, `code`, \(math\) or a run of plain text.
+_MARKED = re.compile(r'(\*\*(.*?)\*\*|_(.*?)_|`([^`]*)`|\\\((.*?)\\\)|([^*_`\\]+))')
+_INLINE_MATH = re.compile(r'\\\((.*?)\\\)')
+_DISPLAY_DELIMITERS = re.compile(r"^\\\[|\\\]$|^\$\$|\$\$")
+_BAD_ESCAPE = re.compile(r"\\[^a-zA-Z]")
+
+_BOLD = (("bold", True),)
+_ITALIC = (("italic", True),)
+_CODE = (("code", True),)
+
+# ("text", content, annotations) or ("equation", expression, None); annotations are (key, value) pairs.
+Spec = Tuple[str, str, Optional[Tuple[Tuple[str, object], ...]]]
+
+
+def is_valid_latex(expr: str) -> bool:
+    """True if braces balance and there is no escape Notion's KaTeX would reject."""
+    expr = _DISPLAY_DELIMITERS.sub("", expr.strip())
+    return expr.count("{") == expr.count("}") and not _BAD_ESCAPE.search(expr)
+
+
+def _text(content: str, annotations=None) -> Tuple[Spec, ...]:
+    return tuple(
+        ("text", content[start:start + MAX_TEXT_LENGTH], annotations)
+        for start in range(0, len(content), MAX_TEXT_LENGTH)
+    )
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _marked_specs(text: str) -> Tuple[Spec, ...]:
+    specs = []
+    for match in _MARKED.finditer(text):
+        _, bold_text, italic_text, code_text, math_inline, plain = match.groups()
+        if bold_text:
+            specs.extend(_text(bold_text, _BOLD))
+        elif italic_text:
+            specs.extend(_text(italic_text, _ITALIC))
+        elif code_text:
+            specs.extend(_text(code_text, _CODE))
+        elif math_inline and is_valid_latex(math_inline):
+            specs.append(("equation", math_inline.strip(), None))
+        elif plain:
+            specs.extend(_text(plain))
+    return tuple(specs)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _math_specs(text: str, suffix: str) -> Tuple[Spec, ...]:
+    specs = []
+    last_end = 0
+    for match in _INLINE_MATH.finditer(text):
+        start, end = match.span()
+        if start > last_end:
+            specs.extend(_text(text[last_end:start]))
+        specs.append(("equation", match.group(1).strip(), None))
+        last_end = end
+    if last_end < len(text):
+        specs.extend(_text(text[last_end:] + suffix))
+    return tuple(specs)
+
+
+def _build(specs: Tuple[Spec, ...]) -> List[dict]:
+    runs = []
+    for kind, value, annotations in specs:
+        if kind == "equation":
+            runs.append({"type": "equation", "equation": {"expression": value}})
+        elif annotations:
+            runs.append({"type": "text", "text": {"content": value}, "annotations": dict(annotations)})
+        else:
+            runs.append({"type": "text", "text": {"content": value}})
+    return runs
+
+
+def marked_text(text: str) -> List[dict]:
+    """
+    Converts a lesson line with **bold**, _italic_, `code` and \\(math\\) into rich text.
+
+    Inline math that is not valid LaTeX is dropped.
+
+    Args:
+        text (str): One line of lesson text.
+
+    Returns:
+        list[dict]: Notion rich-text runs.
+    """
+    return _build(_marked_specs(text))
+
+
+def inline_math(text: str, suffix: str = "") -> List[dict]:
+    """
+    Converts text with \\(math\\) into plain text and equation runs.
+
+    Args:
+        text (str): A quiz question or option.
+        suffix (str, optional): Added to the trailing text, if the text does not end in math. Defaults to "".
+
+    Returns:
+        list[dict]: Notion rich-text runs.
+    """
+    return _build(_math_specs(text, suffix))
+
+
+def clear_cache() -> None:
+    """Forgets all memoized fragments."""
+    _marked_specs.cache_clear()
+    _math_specs.cache_clear()
@@ -0,0 +1,324 @@
+"""Incremental updates of Notion content that is published again on re-runs.
+
+For every synced block list, identified by its parent page and a name (a
+lesson page is (parent, topic); the progress tracker is (parent, tracker
+heading), living in the parent page itself), the index remembers the page that holds it and the ID and hash of
+every block that was published. Publishing the same list again diffs the new
+blocks against the recorded hashes and only sends the inserts, in-place
+updates and deletes needed, so an unchanged lesson costs one request (checking
+that its page still exists) instead of a full republish. Blocks added to the
+page by other tools or by hand are never touched.
+
+Blocks that changed type or have children are replaced (delete + insert)
+rather than updated, since Notion cannot update either in place.
+
+`replace_published` uses the same diff, without the index, to correct blocks
+that were just streamed into a new page (e.g. a draft that turned out to need
+verification).
+
+Topic pages published this way are marked with SYNCED_KEY in NotionTool's
+output, and the tools that add to them (videos, reading, quizzes) publish
+through `publish_section` / `publish_child_pages`, which sync their content
+too instead of appending or creating it again on every run.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from my_custom_tools import notion_writer
+
+DEFAULT_INDEX_PATH = Path.home() / ".cache" / "explain" / "notion_sync.sqlite3"
+
+# Key NotionTool sets on the topic pages it published through this module.
+SYNCED_KEY = "synced"
+
+
+class SyncedBlock(NamedTuple):
+    """A published block: its Notion ID, content hash and, if it can be updated in place, its type."""
+    block_id: str
+    hash: str
+    updatable_type: str
+
+
+class SyncedBlocks(NamedTuple):
+    """Where a synced block list lives and what was last published there."""
+    page_id: str
+    blocks: List[SyncedBlock]
+
+
+def block_hash(block: dict) -> str:
+    """Stable hash of a block's content, including its children."""
+    return hashlib.sha256(json.dumps(block, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:32]
+
+
+def _updatable_type(block: dict) -> str:
+    payload = block.get(block.get("type"))
+    if isinstance(payload, dict) and payload.get("children"):
+        return ""
+    return block.get("type", "")
+
+
+class SyncIndex:
+    """SQLite index of synced block lists keyed by (parent page, name)."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS synced ("
+                "parent_id TEXT NOT NULL, name TEXT NOT NULL, page_id TEXT NOT NULL, blocks TEXT NOT NULL, "
+                "created REAL NOT NULL, updated REAL NOT NULL, PRIMARY KEY (parent_id, name))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, parent_id: str, name: str) -> Optional[SyncedBlocks]:
+        with self._lock, closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT page_id, blocks FROM synced WHERE parent_id = ? AND name = ?", (parent_id, name)
+            ).fetchone()
+        if row is None:
+            return None
+        return SyncedBlocks(row[0], [SyncedBlock(*block) for block in json.loads(row[1])])
+
+    def save(self, parent_id: str, name: str, page_id: str, blocks: List[SyncedBlock]) -> None:
+        now = time.time()
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO synced (parent_id, name, page_id, blocks, created, updated) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (parent_id, name) DO UPDATE SET page_id = excluded.page_id, "
+                "blocks = excluded.blocks, updated = excluded.updated",
+                (parent_id, name, page_id, json.dumps(blocks), now, now),
+            )
+
+    def names(self, parent_id: str) -> List[str]:
+        """Names synced under a parent page, oldest first."""
+        with self._lock, closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT name FROM synced WHERE parent_id = ? ORDER BY created, name", (parent_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+_index: Optional[SyncIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> SyncIndex:
+    """Returns the process-wide index (NOTION_SYNC_PATH overrides its location)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SyncIndex(Path(os.getenv("NOTION_SYNC_PATH", DEFAULT_INDEX_PATH)))
+        return _index
+
+
+def _append_after(container_id: str, blocks: List[dict], after: Optional[str]) -> List[SyncedBlock]:
+    """Inserts blocks after the block `after` (or at the end), 100 per request, returning them as synced."""
+    client = notion_writer.get_client()
+    synced = []
+    for start in range(0, len(blocks), notion_writer.MAX_BLOCKS_PER_REQUEST):
+        chunk = blocks[start:start + notion_writer.MAX_BLOCKS_PER_REQUEST]
+        position = {"after": after} if after else {}
+        response = notion_writer.call(
+            client.blocks.children.append,
+            retry_statuses=notion_writer.CREATE_RETRY_STATUSES,
+            block_id=container_id,
+            children=chunk,
+            **position,
+        )
+        created = response["results"][-len(chunk):]
+        synced.extend(
+            SyncedBlock(result["id"], block_hash(block), _updatable_type(block))
+            for result, block in zip(created, chunk)
+        )
+        after = synced[-1].block_id
+    return synced
+
+
+def _delete(block: SyncedBlock) -> None:
+    try:
+        notion_writer.call(notion_writer.get_client().blocks.delete, block_id=block.block_id)
+    except Exception as e:
+        # Already deleted by hand.
+        if getattr(e, "status", None) != 404:
+            raise
+
+
+def _update(old: SyncedBlock, block: dict) -> SyncedBlock:
+    block_type = block["type"]
+    notion_writer.call(
+        notion_writer.get_client().blocks.update, block_id=old.block_id, **{block_type: block[block_type]}
+    )
+    return SyncedBlock(old.block_id, block_hash(block), block_type)
+
+
+def _apply_diff(
+    container_id: str, old: List[SyncedBlock], blocks: List[dict], done: List[SyncedBlock], remaining: List[SyncedBlock]
+) -> None:
+    """
+    Turns the published `old` blocks into `blocks`. Synced blocks are moved
+    to `done` as they are handled, and `remaining` keeps the old blocks not
+    handled yet, so a failure still leaves an accurate record.
+    """
+    hashes = [block_hash(block) for block in blocks]
+    opcodes = SequenceMatcher(None, [block.hash for block in old], hashes, autojunk=False).get_opcodes()
+    if len(opcodes) > 1 and opcodes[0][0] == "insert" and opcodes[1][0] == "equal":
+        # Notion can only insert after a block, so new blocks at the top are
+        # written over the first old block, which is then inserted again after them.
+        _, _, i2, j1, j2 = opcodes[1]
+        opcodes[:2] = [("replace", 0, 1, 0, j1 + 1)] + ([("equal", 1, i2, j1 + 1, j2)] if i2 > 1 else [])
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == "equal":
+            done.extend(old[i1:i2])
+            del remaining[:i2 - i1]
+            continue
+
+        stale, fresh = old[i1:i2], blocks[j1:j2]
+        updated = 0
+        while (
+            updated < min(len(stale), len(fresh))
+            and stale[updated].updatable_type
+            and stale[updated].updatable_type == _updatable_type(fresh[updated])
+        ):
+            done.append(_update(stale[updated], fresh[updated]))
+            remaining.pop(0)
+            updated += 1
+        # Insert before deleting, right after the last handled block or else after the
+        # stale ones, so new blocks never lose their place above other tools' blocks.
+        inserts = fresh[updated:]
+        if inserts:
+            anchor = done[-1] if done else (stale[-1] if updated < len(stale) else None)
+            done.extend(_append_after(container_id, inserts, anchor.block_id if anchor else None))
+        for block in stale[updated:]:
+            _delete(block)
+            remaining.pop(0)
+
+
+def _sync(parent_id: str, name: str, container_id: str, old: List[SyncedBlock], blocks: List[dict]) -> None:
+    done: List[SyncedBlock] = []
+    remaining = list(old)
+    try:
+        _apply_diff(container_id, old, blocks, done, remaining)
+    finally:
+        get_index().save(parent_id, name, container_id, done + remaining)
+
+
+def _page_exists(page_id: str) -> bool:
+    try:
+        page = notion_writer.call(notion_writer.get_client().pages.retrieve, page_id=page_id)
+    except Exception as e:
+        if getattr(e, "status", None) == 404:
+            return False
+        raise
+    return not (page.get("archived") or page.get("in_trash"))
+
+
+def sync_blocks(page_id: str, name: str, blocks: Iterable[dict]) -> None:
+    """
+    Publishes `blocks` into an existing page (e.g. the parent page itself),
+    diffing against what was published there under `name` before.
+
+    Args:
+        page_id (str): Page the blocks live in; `name` is scoped to it.
+        name (str): Name of the block list, e.g. the tracker heading.
+        blocks (Iterable[dict]): The blocks as they should be now.
+    """
+    record = get_index().get(page_id, name)
+    _sync(page_id, name, page_id, record.blocks if record else [], notion_writer.prepare_blocks(blocks))
+
+
+def sync_page(parent_id: str, title: str, blocks: Iterable[dict]) -> str:
+    """
+    Creates the child page `title` under `parent_id`, or brings the page
+    created by an earlier run up to date with only the changed blocks.
+
+    Args:
+        parent_id (str): ID of the parent page.
+        title (str): Title of the page, also the name it is indexed under.
+        blocks (Iterable[dict]): The page content as it should be now.
+
+    Returns:
+        str: ID of the page.
+    """
+    record = get_index().get(parent_id, title)
+    if record is None or not _page_exists(record.page_id):
+        page_id, old = notion_writer.create_page(parent_id, title)["id"], []
+    else:
+        page_id, old = record.page_id, record.blocks
+    _sync(parent_id, title, page_id, old, notion_writer.prepare_blocks(blocks))
+    return page_id
+
+
+def _child_ids(page_id: str, count: int) -> List[str]:
+    """IDs of the first `count` blocks of a page, in order."""
+    ids: List[str] = []
+    cursor = None
+    while len(ids) < count:
+        position = {"start_cursor": cursor} if cursor else {}
+        response = notion_writer.call(
+            notion_writer.get_client().blocks.children.list, block_id=page_id, page_size=100, **position
+        )
+        ids.extend(block["id"] for block in response["results"])
+        if not response.get("has_more"):
+            break
+        cursor = response["next_cursor"]
+    return ids[:count]
+
+
+def replace_published(page_id: str, published: Iterable[dict], blocks: Iterable[dict]) -> None:
+    """
+    Turns the blocks just published at the top of a page into `blocks`, sending
+    only the updates, inserts and deletes needed. Nothing is recorded in the index.
+
+    Args:
+        page_id (str): The page, before any other tool added to it.
+        published (Iterable[dict]): The blocks it was created with, in order.
+        blocks (Iterable[dict]): The blocks as they should be now.
+    """
+    published = notion_writer.prepare_blocks(published)
+    ids = _child_ids(page_id, len(published))
+    if len(ids) < len(published):
+        raise RuntimeError(f"Page {page_id} has {len(ids)} blocks, {len(published)} were published")
+    old = [SyncedBlock(block_id, block_hash(block), _updatable_type(block)) for block_id, block in zip(ids, published)]
+    _apply_diff(page_id, old, notion_writer.prepare_blocks(blocks), [], list(old))
+
+
+def publish_section(topic_page: Dict[str, str], name: str, blocks: List[dict], plan_run_id=None) -> None:
+    """
+    Adds a tool's section (e.g. videos or reading) to a topic page from NotionTool.
+
+    Synced topic pages get the section synced under `name`, so a re-run only
+    sends what changed; other pages get it appended (or queued) as usual.
+    """
+    if topic_page.get(SYNCED_KEY):
+        sync_blocks(topic_page["page_id"], name, blocks)
+    else:
+        notion_writer.queue_append(plan_run_id, topic_page["page_id"], blocks)
+
+
+def publish_child_pages(
+    topic_page: Dict[str, str], pages: Sequence[Tuple[str, List[dict]]], plan_run_id=None
+) -> None:
+    """
+    Creates (title, blocks) child pages under a topic page from NotionTool.
+
+    Under synced topic pages, each child page is synced by title instead, so a
+    re-run updates the existing pages rather than adding new ones.
+    """
+    if topic_page.get(SYNCED_KEY):
+        for title, blocks in pages:
+            sync_page(topic_page["page_id"], title, blocks)
+    else:
+        notion_writer.queue_pages(plan_run_id, [(topic_page["page_id"], title, blocks) for title, blocks in pages])
@@ -0,0 +1,462 @@
+"""Shared Notion writer used by every tool that publishes to Notion.
+
+All writes go through one ``notion_client.Client`` and one token bucket tuned
+to Notion's average limit of 3 requests per second, so tools running in
+parallel share the budget instead of tripping 429s. Block lists are split
+into appends of at most 100 blocks and rich text longer than 2000 characters
+is split into several runs, so long lessons and summaries no longer fail
+outright. Rate-limited and transient failures are retried with backoff;
+page creations and appends, which may already have gone through when a 409
+or 5xx comes back, are only retried on 429.
+
+With NOTION_WRITE_BUFFER=1, appends and child pages that nothing later in the
+run depends on are queued per plan run instead of sent right away, and
+``flush_run`` commits them at the end of the run: all blocks queued for a
+page go out as one consolidated append (split only at 100 blocks), so a
+topic page gets one request instead of one per tool. Queued writes are
+journaled as soon as they are queued, so a run that dies before its flush
+can still be resumed.
+
+Writes made with a ``plan_run_id`` are first recorded in the write-ahead
+journal (see ``notion_journal``) and marked sent once Notion accepts them,
+so a run that fails partway through publishing can be finished with
+``resume_run`` instead of regenerating its content. A write already sent
+under the same idempotency key is skipped; only a write that was in flight
+when the process died may be sent twice.
+"""
+
+import copy
+import functools
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from notion_client import Client
+
+from my_custom_tools.fanout import FanOutResult, fan_out
+from my_custom_tools.http_client import BACKOFF_BASE, BACKOFF_CAP, TokenBucket
+from my_custom_tools.notion_journal import SENT, JournalEntry, NotionJournal, get_journal
+from my_custom_tools.notion_richtext import MAX_TEXT_LENGTH
+
+REQUESTS_PER_SECOND = 3.0
+MAX_BLOCKS_PER_REQUEST = 100
+MAX_RETRIES = 3
+RETRY_STATUSES = {409, 429, 500, 502, 503, 504}
+# Page creations and appends may have gone through before a 409/5xx, so retrying
+# them could duplicate content; they are only retried when Notion rejected them outright.
+CREATE_RETRY_STATUSES = {429}
+
+_client: Optional[Client] = None
+_bucket = TokenBucket(REQUESTS_PER_SECOND, int(REQUESTS_PER_SECOND))
+_lock = threading.Lock()
+_buffers: Dict[str, "WriteBuffer"] = {}
+
+
+def get_client() -> Client:
+    """Returns the process-wide Notion client (NOTION_API_KEY), creating it on first use."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = Client(auth=os.getenv("NOTION_API_KEY"))
+        return _client
+
+
+def call(method: Callable[..., Any], *, retry_statuses=RETRY_STATUSES, **kwargs) -> Any:
+    """
+    Calls a Notion client method under the shared rate limit, retrying 429s and 5xx.
+
+    Args:
+        method (Callable): A bound client method, e.g. ``get_client().pages.update``.
+        retry_statuses (set, optional): HTTP statuses that are retried. Defaults to RETRY_STATUSES;
+            pass CREATE_RETRY_STATUSES for writes that are not idempotent.
+        **kwargs: Passed through to the method.
+
+    Returns:
+        The API response.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        _bucket.acquire()
+        try:
+            return method(**kwargs)
+        except Exception as e:
+            if getattr(e, "status", None) not in retry_statuses or attempt == MAX_RETRIES:
+                raise
+            time.sleep(random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt + 1))))
+
+
+def split_rich_text(rich_text: List[dict]) -> List[dict]:
+    """Splits text runs longer than Notion's 2000-character limit into consecutive runs with the same styling."""
+    runs = []
+    for run in rich_text:
+        content = run.get("text", {}).get("content", "")
+        if run.get("type") != "text" or len(content) <= MAX_TEXT_LENGTH:
+            runs.append(run)
+            continue
+        for start in range(0, len(content), MAX_TEXT_LENGTH):
+            piece = copy.deepcopy(run)
+            piece["text"]["content"] = content[start:start + MAX_TEXT_LENGTH]
+            runs.append(piece)
+    return runs
+
+
+def prepare_blocks(blocks: Iterable[dict]) -> List[dict]:
+    """Returns copies of `blocks` whose rich text (including nested children) fits Notion's limits."""
+    prepared = []
+    for block in blocks:
+        block = dict(block)
+        payload = block.get(block.get("type"))
+        if isinstance(payload, dict):
+            payload = dict(payload)
+            if "rich_text" in payload:
+                payload["rich_text"] = split_rich_text(payload["rich_text"])
+            if "children" in payload:
+                payload["children"] = prepare_blocks(payload["children"])
+            block[block["type"]] = payload
+        prepared.append(block)
+    return prepared
+
+
+def _chunks(blocks: List[dict]) -> List[List[dict]]:
+    return [blocks[i:i + MAX_BLOCKS_PER_REQUEST] for i in range(0, len(blocks), MAX_BLOCKS_PER_REQUEST)]
+
+
+def _title(title: str) -> Dict[str, list]:
+    return {"title": [{"type": "text", "text": {"content": title}}]}
+
+
+def _send_create_page(parent_id: str, title: str, children: List[dict]) -> dict:
+    return call(
+        get_client().pages.create,
+        retry_statuses=CREATE_RETRY_STATUSES,
+        parent={"type": "page_id", "page_id": parent_id},
+        properties=_title(title),
+        children=children,
+    )
+
+
+def _send_append(block_id: str, children: List[dict]) -> dict:
+    return call(
+        get_client().blocks.children.append, retry_statuses=CREATE_RETRY_STATUSES, block_id=block_id, children=children
+    )
+
+
+def _send_update_page(page_id: str, **kwargs) -> dict:
+    return call(get_client().pages.update, page_id=page_id, **kwargs)
+
+
+# Journal operation -> sender taking the resolved target and the journaled payload.
+_SENDERS: Dict[str, Callable[..., dict]] = {
+    "create_page": _send_create_page,
+    "append": _send_append,
+    "update_page": _send_update_page,
+}
+
+
+def _send_entry(journal: NotionJournal, entry: JournalEntry) -> Optional[str]:
+    """Sends a journaled write unless it was already sent; returns the page ID it produced, if any."""
+    if entry.status == SENT:
+        return entry.result
+    try:
+        response = _SENDERS[entry.op](journal.resolve(entry.target), **entry.payload)
+    except Exception as e:
+        journal.mark_failed(entry.key, e)
+        raise
+    result = response.get("id") if entry.op != "append" and isinstance(response, dict) else None
+    journal.mark_sent(entry.key, result)
+    return result
+
+
+def _send_journaled(journal: NotionJournal, key: str) -> Optional[str]:
+    return _send_entry(journal, journal.get(key))
+
+
+def append_blocks(block_id: str, blocks: Iterable[dict], plan_run_id=None) -> None:
+    """Appends blocks to a page or block, in order, 100 blocks per request (journaled when `plan_run_id` is given)."""
+    chunks = _chunks(prepare_blocks(blocks))
+    if plan_run_id is None:
+        for chunk in chunks:
+            _send_append(block_id, chunk)
+        return
+    journal = get_journal()
+    keys = [journal.record(plan_run_id, "append", block_id, {"children": chunk}) for chunk in chunks]
+    for key in keys:
+        _send_journaled(journal, key)
+
+
+def create_page(parent_id: str, title: str, blocks: Iterable[dict] = (), plan_run_id=None) -> dict:
+    """
+    Creates a child page with the first 100 blocks and appends the rest.
+
+    Args:
+        parent_id (str): ID of the parent page.
+        title (str): Title of the new page.
+        blocks (Iterable[dict], optional): Page content. Defaults to none.
+        plan_run_id (optional): Journal the writes under this plan run. Defaults to no journaling.
+
+    Returns:
+        dict: The Notion response for the created page; only {"id": ...} when journaled.
+    """
+    chunks = _chunks(prepare_blocks(blocks)) or [[]]
+    if plan_run_id is None:
+        page = _send_create_page(parent_id, title, chunks[0])
+        for chunk in chunks[1:]:
+            _send_append(page["id"], chunk)
+        return page
+
+    # Journal the whole page before sending anything, so a resume can finish it.
+    journal = get_journal()
+    create, appends = _journal_page(journal, plan_run_id, parent_id, title, chunks)
+    return {"id": _send_journaled_page(journal, create, appends)}
+
+
+def _journal_page(
+    journal: NotionJournal, plan_run_id, parent_id: str, title: str, chunks: List[List[dict]]
+) -> Tuple[str, List[str]]:
+    """Journals a page creation and its follow-up appends, returning their keys."""
+    create = journal.record(plan_run_id, "create_page", parent_id, {"title": title, "children": chunks[0]})
+    appends = [journal.record(plan_run_id, "append", f"@{create}", {"children": chunk}) for chunk in chunks[1:]]
+    return create, appends
+
+
+def _send_journaled_page(journal: NotionJournal, create: str, appends: List[str]) -> str:
+    page_id = _send_journaled(journal, create)
+    for key in appends:
+        _send_journaled(journal, key)
+    return page_id
+
+
+def create_pages(
+    pages: Sequence[Tuple[str, str, List[dict]]], max_workers: int = 4, plan_run_id=None
+) -> FanOutResult:
+    """
+    Creates several pages concurrently under the shared rate limit.
+
+    Args:
+        pages (Sequence[tuple]): (parent_id, title, blocks) per page.
+        max_workers (int, optional): Pages in flight at once. Defaults to 4.
+        plan_run_id (optional): Journal the writes under this plan run. Defaults to no journaling.
+
+    Returns:
+        FanOutResult: Created pages (or errors) in the same order as `pages`.
+    """
+    return fan_out(pages, lambda page: create_page(*page, plan_run_id=plan_run_id), max_workers)
+
+
+def update_page(page_id: str, plan_run_id=None, **kwargs) -> dict:
+    """Updates a page's properties under the shared rate limit (journaled when `plan_run_id` is given)."""
+    if plan_run_id is None:
+        return _send_update_page(page_id, **kwargs)
+    journal = get_journal()
+    return {"id": _send_journaled(journal, journal.record(plan_run_id, "update_page", page_id, kwargs))}
+
+
+def create_page_streaming(
+    parent_id: str, title: str, blocks: Iterable[dict], batch_size: int = 10, plan_run_id=None
+) -> dict:
+    """
+    Creates a Notion page from blocks that are still being produced.
+
+    The page is created as soon as the first `batch_size` blocks are ready and
+    the rest are appended in batches as they arrive, so content shows up in
+    Notion while the model is still writing.
+
+    Args:
+        parent_id (str): ID of the parent page.
+        title (str): Title of the new page.
+        blocks (Iterable[dict]): Notion blocks, e.g. from a streaming parser.
+        batch_size (int, optional): Blocks per request, at most 100. Defaults to 10.
+        plan_run_id (optional): Journal each batch under this plan run. Defaults to no journaling.
+
+    Returns:
+        dict: The Notion response for the created page; only {"id": ...} when journaled.
+    """
+    batch_size = min(batch_size, MAX_BLOCKS_PER_REQUEST)
+    page = None
+    batch = []
+
+    def flush():
+        nonlocal page, batch
+        if page is None:
+            page = create_page(parent_id, title, batch, plan_run_id)
+        elif batch:
+            append_blocks(page["id"], batch, plan_run_id)
+        batch = []
+
+    for block in blocks:
+        batch.append(block)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return page
+
+
+def buffering_enabled() -> bool:
+    """True when NOTION_WRITE_BUFFER is set to 1/true/yes."""
+    return os.getenv("NOTION_WRITE_BUFFER", "").strip().lower() in {"1", "true", "yes"}
+
+
+class WriteBuffer:
+    """
+    Appends and page creations queued for one plan run, committed by `flush`.
+
+    With a plan run ID, every write is journaled as pending when it is queued,
+    so a run that dies before its flush leaves it for ``resume_run``.
+    """
+
+    def __init__(self, plan_run_id=None):
+        self.plan_run_id = plan_run_id
+        # Block ID -> queued chunks of at most 100 blocks, with their journal keys (None when not journaled).
+        self._appends: Dict[str, List[Tuple[Optional[str], List[dict]]]] = {}
+        # (title, function that creates the page) per queued page.
+        self._pages: List[Tuple[str, Callable[[], Any]]] = []
+        self._lock = threading.Lock()
+
+    def append(self, block_id: str, blocks: Iterable[dict]) -> None:
+        chunks = _chunks(prepare_blocks(blocks))
+        if self.plan_run_id is None:
+            queued = [(None, chunk) for chunk in chunks]
+        else:
+            journal = get_journal()
+            queued = [
+                (journal.record(self.plan_run_id, "append", block_id, {"children": chunk}), chunk) for chunk in chunks
+            ]
+        with self._lock:
+            self._appends.setdefault(block_id, []).extend(queued)
+
+    def add_pages(self, pages: Iterable[Tuple[str, str, List[dict]]]) -> None:
+        queued = []
+        for parent_id, title, blocks in pages:
+            if self.plan_run_id is None:
+                queued.append((title, functools.partial(create_page, parent_id, title, blocks)))
+                continue
+            journal = get_journal()
+            chunks = _chunks(prepare_blocks(blocks)) or [[]]
+            create, appends = _journal_page(journal, self.plan_run_id, parent_id, title, chunks)
+            queued.append((title, functools.partial(_send_journaled_page, journal, create, appends)))
+        with self._lock:
+            self._pages.extend(queued)
+
+    def flush(self, max_workers: int = 4) -> List[Tuple[str, Exception]]:
+        """
+        Sends everything queued: one append per page (in queue order) and the
+        queued pages, both concurrently across pages, marking their journal
+        entries as they go.
+
+        Returns:
+            list[tuple]: (page ID or page title, error) for every write that failed.
+        """
+        with self._lock:
+            appends, self._appends = self._appends, {}
+            pages, self._pages = self._pages, []
+
+        appended = fan_out(list(appends.items()), lambda item: _send_queued_appends(*item), max_workers)
+        created = fan_out(pages, lambda page: page[1](), max_workers)
+        return (
+            [(block_id, error) for (block_id, _), error in appended.failures()]
+            + [(title, error) for (title, _), error in created.failures()]
+        )
+
+
+def _send_queued_appends(block_id: str, queued: List[Tuple[Optional[str], List[dict]]]) -> None:
+    """
+    Sends a page's queued chunks in as few appends as fit 100 blocks, without
+    splitting a chunk, so each journal entry is marked by the request that sent it.
+    """
+    journal = get_journal()
+    request: List[Tuple[Optional[str], List[dict]]] = []
+
+    def send() -> None:
+        keys = [key for key, _ in request if key is not None]
+        try:
+            _send_append(block_id, [block for _, chunk in request for block in chunk])
+        except Exception as e:
+            for key in keys:
+                journal.mark_failed(key, e)
+            raise
+        for key in keys:
+            journal.mark_sent(key)
+
+    for key, chunk in queued:
+        if request and sum(len(queued_chunk) for _, queued_chunk in request) + len(chunk) > MAX_BLOCKS_PER_REQUEST:
+            send()
+            request = []
+        request.append((key, chunk))
+    if request:
+        send()
+
+
+def _buffer_for(plan_run_id) -> "WriteBuffer":
+    with _lock:
+        if str(plan_run_id) not in _buffers:
+            _buffers[str(plan_run_id)] = WriteBuffer(plan_run_id)
+        return _buffers[str(plan_run_id)]
+
+
+def queue_append(plan_run_id, block_id: str, blocks: List[dict]) -> None:
+    """Appends blocks now, or queues them for the run's flush when buffering is enabled."""
+    if buffering_enabled():
+        _buffer_for(plan_run_id).append(block_id, blocks)
+    else:
+        append_blocks(block_id, blocks, plan_run_id)
+
+
+def queue_pages(plan_run_id, pages: Sequence[Tuple[str, str, List[dict]]], max_workers: int = 4) -> None:
+    """
+    Creates pages now, or queues them for the run's flush when buffering is enabled.
+
+    Only for pages whose IDs nothing else in the run needs. Raises the first
+    error when the pages are created immediately.
+    """
+    if buffering_enabled():
+        _buffer_for(plan_run_id).add_pages(pages)
+        return
+    for _, error in create_pages(pages, max_workers, plan_run_id).failures():
+        raise error
+
+
+def flush_run(plan_run_id, max_workers: int = 4) -> None:
+    """
+    Commits and forgets everything queued for a plan run, reporting failed writes.
+
+    Once every journaled write of the run has been sent, its journal entries
+    are dropped; otherwise they are kept for ``resume_run``.
+    """
+    with _lock:
+        buffer = _buffers.pop(str(plan_run_id), None)
+    if buffer is not None:
+        for target, error in buffer.flush(max_workers):
+            print(f"❌ Failed to write '{target}' to Notion: {error}")
+
+    journal = get_journal()
+    unsent = journal.entries(plan_run_id, unsent_only=True)
+    if unsent:
+        print(f"⚠️ {len(unsent)} Notion writes of run {plan_run_id} were not sent; "
+              f"finish them with: python -m my_custom_tools.notion_journal resume {plan_run_id}")
+    else:
+        journal.forget(plan_run_id)
+
+
+def resume_run(plan_run_id) -> bool:
+    """
+    Sends a plan run's journaled writes that never reached Notion, in their original order.
+
+    Writes into a page whose creation fails again are reported and left for the next resume.
+
+    Returns:
+        bool: True if every write of the run has now been sent.
+    """
+    journal = get_journal()
+    unsent = journal.entries(plan_run_id, unsent_only=True)
+    sent = 0
+    for entry in unsent:
+        try:
+            _send_entry(journal, entry)
+            sent += 1
+        except Exception as e:
+            print(f"❌ Failed to resend {entry.op} to '{entry.target}': {e}")
+    print(f"ℹ️ Resent {sent} of {len(unsent)} pending Notion writes for run {plan_run_id}")
+    if sent == len(unsent):
+        journal.forget(plan_run_id)
+    return sent == len(unsent)
@@ -0,0 +1,157 @@
+"""Content-addressed PDF store shared by every run.
+
+Downloaded PDFs are kept once under their SHA-256 in a persistent store and
+indexed by a paper key (the arXiv ID and version, or the URL for other
+sources). A run's ``papers`` folder only holds hard links (or copies, where
+links are not possible) to the blobs it asked for, so clearing that folder
+never throws away a download. The store is bounded in size and evicts the
+least recently used blobs first.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_STORE_DIR = Path.home() / ".cache" / "explain" / "paper_store"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+_ARXIV_ID = re.compile(r"arxiv\.org/(?:pdf|abs)/([^?#]+?)(?:\.pdf)?(?:[?#].*)?$")
+
+
+def paper_key(url: str) -> str:
+    """
+    Returns the store key for a paper URL.
+
+    Args:
+        url (str): Link to the PDF.
+
+    Returns:
+        str: "arxiv:<id>[v<version>]" for arXiv links, otherwise "url:<url>".
+    """
+    match = _ARXIV_ID.search(url)
+    if match:
+        return f"arxiv:{match.group(1)}"
+    return f"url:{url}"
+
+
+def file_sha256(path: Path) -> str:
+    """Hashes a file in chunks so large PDFs are never fully loaded."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src: Path, dest: Path) -> None:
+    """Hard-links `src` to `dest`, falling back to a copy across filesystems."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if dest.exists():
+        dest.unlink()
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+
+class PaperStore:
+    """SQLite-indexed blob store with size-bounded LRU eviction."""
+
+    def __init__(self, root: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._blob_dir = self.root / "blobs"
+        self._blob_dir.mkdir(parents=True, exist_ok=True)
+        self._db_path = self.root / "index.sqlite3"
+        self._lock = threading.Lock()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs ("
+                "sha256 TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS keys ("
+                "key TEXT PRIMARY KEY, sha256 TEXT NOT NULL REFERENCES blobs(sha256))"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._db_path, timeout=30)
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self._blob_dir / sha256[:2] / f"{sha256}.pdf"
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Returns the blob stored under `key` and marks it as recently used."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT sha256 FROM keys WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            blob = self._blob_path(row[0])
+            if not blob.exists():
+                conn.execute("DELETE FROM keys WHERE sha256 = ?", (row[0],))
+                conn.execute("DELETE FROM blobs WHERE sha256 = ?", (row[0],))
+                return None
+            conn.execute("UPDATE blobs SET last_used = ? WHERE sha256 = ?", (time.time(), row[0]))
+            return blob
+
+    def add(self, key: str, path: Path) -> Path:
+        """
+        Stores the file at `path` under `key`, deduplicating by content.
+
+        Args:
+            key (str): Paper key from `paper_key`.
+            path (Path): A completed, checked PDF.
+
+        Returns:
+            Path: The blob the key now points at.
+        """
+        sha256 = file_sha256(path)
+        blob = self._blob_path(sha256)
+        with self._lock, closing(self._connect()) as conn, conn:
+            if not blob.exists():
+                link_or_copy(path, blob)
+            conn.execute(
+                "INSERT OR REPLACE INTO blobs (sha256, size, last_used) VALUES (?, ?, ?)",
+                (sha256, blob.stat().st_size, time.time()),
+            )
+            conn.execute("INSERT OR REPLACE INTO keys (key, sha256) VALUES (?, ?)", (key, sha256))
+            self._evict(conn, keep=sha256)
+        return blob
+
+    def _evict(self, conn: sqlite3.Connection, keep: str) -> None:
+        """Deletes least recently used blobs until the store fits in `max_bytes`."""
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = conn.execute(
+            "SELECT sha256, size FROM blobs WHERE sha256 != ? ORDER BY last_used", (keep,)
+        ).fetchall()
+        for sha256, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._blob_path(sha256).unlink(missing_ok=True)
+            conn.execute("DELETE FROM keys WHERE sha256 = ?", (sha256,))
+            conn.execute("DELETE FROM blobs WHERE sha256 = ?", (sha256,))
+            total -= size
+
+
+_store: Optional[PaperStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> PaperStore:
+    """Returns the process-wide store configured by PAPER_STORE_DIR / PAPER_STORE_MAX_BYTES."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            root = Path(os.getenv("PAPER_STORE_DIR", DEFAULT_STORE_DIR))
+            max_bytes = int(os.getenv("PAPER_STORE_MAX_BYTES", DEFAULT_MAX_BYTES))
+            _store = PaperStore(root, max_bytes)
+        return _store
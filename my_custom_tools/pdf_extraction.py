@@ -0,0 +1,470 @@
+"""PDF text extraction and cleaning used by PDFReaderTool.
+
+Kept free of Portia imports so worker processes can import it cheaply.
+"""
+
+import codecs
+import hashlib
+import html
+import math
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from my_custom_tools.disk_cache import DiskCache
+from my_custom_tools.paper_store import file_sha256
+
+# Page count from which a single PDF is split across worker processes.
+PAGE_SHARD_THRESHOLD = 100
+
+# Outline entries that start the back matter, optionally numbered ("7 References", "A. Appendix").
+_BACK_MATTER_TITLE = re.compile(
+    r"^\s*(?:(?:\d+|[A-Z]|[IVXLC]+)[.:)]?\s+)?(?i:references|bibliography|appendix|appendices)\b"
+)
+
+_CONTROL_CHARS = re.compile(r'[\x00-\x1f\x7f-\x9f]+')
+_FOOTER_WORDS = re.compile(r'arxiv|preprint', re.IGNORECASE)
+
+# Characters of cleaned text kept in memory before `SpooledText` spills to disk.
+SPILL_THRESHOLD = 8 * 1024 ** 2
+# Characters read back from a spilled handle at a time.
+READ_CHUNK = 64 * 1024
+
+DEFAULT_TEXT_CACHE_DIR = Path.home() / ".cache" / "explain" / "text_cache"
+DEFAULT_TEXT_CACHE_MAX_BYTES = 512 * 1024 ** 2
+
+
+def sanitize_text(text: str) -> str:
+    """
+    Flattens extracted text onto one line for use in prompts and JSON.
+
+    Whitespace runs (including newlines and tabs) become single spaces, HTML
+    entities are unescaped, control characters are dropped and double quotes
+    escaped, using as few full-text passes as possible.
+    """
+    # Entities can decode to whitespace or quotes, so unescape before anything else
+    if "&" in text:
+        text = html.unescape(text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' '))
+
+    # Collapse whitespace runs; str.split() uses the same whitespace set as \s
+    text = " ".join(text.split())
+
+    # Remove control characters, escape quotes for JSON, and strip what removal exposed
+    return _CONTROL_CHARS.sub('', text).replace('"', '\\"').strip()
+
+
+def remove_arxiv_footer(text: str) -> str:
+    """Removes common arXiv-style footers."""
+    lines = text.splitlines()
+    # Case-insensitive matching is looser than lower(), so a miss is safe to skip the filter
+    if _FOOTER_WORDS.search(text) is None:
+        return "\n".join(lines)
+    return "\n".join(
+        line for line in lines
+        if "arxiv" not in (lowered := line.lower()) and "preprint" not in lowered
+    )
+
+
+def is_bibliography_page(text: str) -> bool:
+    """Returns True if the page looks like it's starting the bibliography or references."""
+    lowered = text.lower()
+    # Check if 'references' or 'bibliography' is a standalone word early in the text
+    return "references\n" in lowered or lowered.strip().startswith(("references", "bibliography"))
+
+
+def read_pdf(file_path: Path, page_workers: int = 1, shard_threshold: int = PAGE_SHARD_THRESHOLD) -> str:
+    """Extracts and cleans text from a PDF file, stopping before References/Bibliography."""
+    return "\n\n".join(iter_pages(file_path, page_workers, shard_threshold))
+
+
+def iter_pages(file_path: Path, page_workers: int = 1, shard_threshold: int = PAGE_SHARD_THRESHOLD) -> Iterator[str]:
+    """
+    Yields each body page of a PDF as "--- Page N ---\n<text>", one page at a time.
+
+    When the PDF has an outline, the body is taken to end where the first
+    References/Bibliography/Appendix entry starts and only those pages are read.
+    Within those pages (or every page, without an outline) reading still stops
+    at the first page `is_bibliography_page` matches, so references that the
+    outline does not list are skipped as before.
+
+    Documents with at least `shard_threshold` pages are split into page ranges
+    that `page_workers` processes extract side by side; the output is identical
+    to reading the pages in order.
+    """
+    with fitz.open(file_path) as doc:
+        page_count = doc.page_count
+        body_end = outline_body_end(doc)
+    if body_end is not None:
+        print(f"Reading pages 1-{body_end} (outline marks the end of the body).")
+        page_count = body_end
+
+    if page_workers > 1 and page_count >= shard_threshold:
+        pages = _read_pages_sharded(file_path, page_count, page_workers)
+    else:
+        pages = _iter_pages(str(file_path), 0, page_count)
+
+    for page_num, cleaned_text, is_bibliography in pages:
+        if is_bibliography:
+            print(f"Stopping at page {page_num + 1} (found References section).")
+            break
+        yield f"--- Page {page_num + 1} ---\n{cleaned_text.strip()}"
+
+
+def outline_body_end(doc: fitz.Document) -> Optional[int]:
+    """
+    Uses the PDF outline to find where the body ends.
+
+    Returns:
+        int | None: Number of body pages, i.e. the 0-based index of the page on which
+        the first References/Bibliography/Appendix entry starts, or None when the
+        outline is missing or has no such entry.
+    """
+    for _, title, page in doc.get_toc(simple=True):
+        if page > 1 and _BACK_MATTER_TITLE.match(title):
+            return page - 1
+    return None
+
+
+def _iter_pages(file_path: str, start: int, stop: int) -> Iterator[Tuple[int, str, bool]]:
+    """
+    Yields (page number, footer-free text, is bibliography) for pages in [start, stop),
+    ending early at the first bibliography page.
+    """
+    with fitz.open(file_path) as doc:
+        for page_num in range(start, stop):
+            page_text = doc[page_num].get_text("text")
+            cleaned_text = remove_arxiv_footer(page_text)
+
+            #Check for 'References' or 'Bibliography' section header
+            is_bibliography = is_bibliography_page(cleaned_text)
+            yield page_num, cleaned_text, is_bibliography
+            if is_bibliography:
+                break
+
+
+def _read_pages(file_path: str, start: int, stop: int) -> List[Tuple[int, str, bool]]:
+    """Worker entry point: `_iter_pages` for one shard, as a picklable list."""
+    return list(_iter_pages(file_path, start, stop))
+
+
+def _read_pages_sharded(file_path: Path, page_count: int, page_workers: int) -> Iterator[Tuple[int, str, bool]]:
+    """Yields the pages of `file_path` in order, extracting page ranges in parallel."""
+    # Twice as many shards as workers keeps them busy when shards take uneven time.
+    shard_size = max(1, math.ceil(page_count / (page_workers * 2)))
+    with multiprocessing.get_context("spawn").Pool(processes=page_workers) as pool:
+        shards = [
+            pool.apply_async(_read_pages, (str(file_path), start, min(start + shard_size, page_count)))
+            for start in range(0, page_count, shard_size)
+        ]
+        for shard in shards:
+            pages = shard.get()
+            yield from pages
+            if pages and pages[-1][2]:
+                # Bibliography found; the pool is terminated with the later shards.
+                return
+
+
+class SpooledText:
+    """
+    Lazy handle to a document's cleaned text.
+
+    Text is kept in memory until it grows past `max_size` characters and is then
+    spilled to a temporary file, so very long documents never have to be held as
+    one giant string. Read it back in chunks by iterating (or whole with `read()`).
+
+    A pickled handle (e.g. one returned from a worker process) carries the path
+    of its file rather than the text. Whoever ends up with the handle owns the
+    file and should close it.
+    """
+
+    def __init__(self, max_size: int = SPILL_THRESHOLD):
+        self.max_size = max_size
+        # True if the handle holds an "Error reading file: ..." message instead of text.
+        self.failed = False
+        self._chunks: List[str] = []
+        self._length = 0
+        self._path: Optional[str] = None
+        self._file = None
+
+    @classmethod
+    def failure(cls, message: str) -> "SpooledText":
+        """A handle holding an error message in place of the document."""
+        handle = cls()
+        handle.write(message)
+        handle.failed = True
+        return handle
+
+    def write(self, text: str) -> None:
+        if self._path is None and self._length + len(text) > self.max_size:
+            fd, self._path = tempfile.mkstemp(prefix="explain-text-", suffix=".txt")
+            self._file = open(fd, "w", encoding="utf-8", newline="")
+            self._file.writelines(self._chunks)
+            self._chunks = []
+        if self._path is None:
+            self._chunks.append(text)
+        else:
+            if self._file is None:
+                self._file = open(self._path, "a", encoding="utf-8", newline="")
+            self._file.write(text)
+        self._length += len(text)
+
+    @property
+    def spilled(self) -> bool:
+        """True once the text has been moved to disk."""
+        return self._path is not None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[str]:
+        if self._path is None:
+            yield from self._chunks
+            return
+        if self._file is not None:
+            self._file.flush()
+        with open(self._path, encoding="utf-8", newline="") as f:
+            for chunk in iter(lambda: f.read(READ_CHUNK), ""):
+                yield chunk
+
+    def read(self) -> str:
+        return "".join(self)
+
+    def __str__(self) -> str:
+        return self.read()
+
+    def close(self) -> None:
+        """Releases the text and deletes the spill file, if any."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._path is not None:
+            Path(self._path).unlink(missing_ok=True)
+            self._path = None
+        self._chunks = []
+        self._length = 0
+
+    def __enter__(self) -> "SpooledText":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __getstate__(self) -> dict:
+        if self._file is not None:
+            self._file.flush()
+        return {**self.__dict__, "_file": None}
+
+
+def _collapse_page(page: str) -> str:
+    """The entity and whitespace steps of `sanitize_text` for one page, without outer spaces."""
+    if "&" in page:
+        page = html.unescape(page.replace('\n', ' ').replace('\r', ' ').replace('\t', ' '))
+    return " ".join(page.split())
+
+
+def stream_clean_text(
+    file_path: Path, page_workers: int = 1, shard_threshold: int = PAGE_SHARD_THRESHOLD
+) -> Iterator[str]:
+    """
+    Extracts a PDF page by page, yielding each page's cleaned text as it is produced.
+
+    The pieces concatenate to ``sanitize_text(read_pdf(file_path))`` but are built
+    without the joined document or sanitize's full-text copies: pages are joined by
+    the single space sanitize would leave between them, and the outer strip is
+    applied by holding back trailing whitespace until more text follows.
+    """
+    started = False
+    pending = ""
+    for page in iter_pages(file_path, page_workers, shard_threshold):
+        piece = _collapse_page(page)
+        if not piece:
+            continue  # A blank page merges into the whitespace around it.
+        piece = _CONTROL_CHARS.sub('', piece).replace('"', '\\"')
+        if started:
+            piece = " " + piece
+        else:
+            piece = piece.lstrip()
+            if not piece:
+                continue
+            started = True
+        body = piece.rstrip()
+        if body:
+            yield pending + body
+            pending = piece[len(body):]
+        else:
+            pending += piece
+
+
+def extract_text(file_path, page_workers: int = 1, spill_threshold: int = SPILL_THRESHOLD) -> SpooledText:
+    """
+    Reads and sanitizes one PDF into a SpooledText, returning a failed handle
+    with the error message instead of raising.
+
+    Errors are formatted here (rather than re-raised across processes) so the
+    serial and multi-process paths produce identical output. Pages are written
+    into the handle as they are cleaned, so past `spill_threshold` characters the
+    document goes to disk instead of memory, and a worker process sends back
+    only the file's path.
+    """
+    handle = SpooledText(spill_threshold)
+    try:
+        for piece in stream_clean_text(Path(file_path), page_workers=page_workers):
+            handle.write(piece)
+    except Exception as e:
+        handle.close()
+        return SpooledText.failure(f"Error reading file: {str(e)}")
+    return handle
+
+
+def _send_text(file_path: str, page_workers: int, spill_threshold: int, sender) -> None:
+    """Process entry point: `extract_text` with the handle sent back through a pipe."""
+    with sender:
+        sender.send(extract_text(file_path, page_workers, spill_threshold))
+
+
+def extract_text_with_timeout(
+    file_path: Path, timeout: float, page_workers: int = 1, spill_threshold: int = SPILL_THRESHOLD
+) -> SpooledText:
+    """
+    `extract_text` in a child process that is killed after `timeout` seconds.
+
+    The child is an ordinary (non-daemon) process, so unlike a pool worker it
+    can still split a long PDF across `page_workers` processes of its own.
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_send_text, args=(str(file_path), page_workers, spill_threshold, sender))
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            return SpooledText.failure(f"Error reading file: timed out after {timeout:.0f}s")
+        return receiver.recv()
+    except EOFError:
+        process.join()
+        return SpooledText.failure(f"Error reading file: extraction process exited with code {process.exitcode}")
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+
+def _read_cached(cache: DiskCache, key: str, spill_threshold: int) -> Optional[SpooledText]:
+    """Decompresses a cached text into a SpooledText chunk by chunk, or returns None on a miss."""
+    handle = SpooledText(spill_threshold)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    if not cache.get_into(key, lambda data: handle.write(decoder.decode(data))):
+        handle.close()
+        return None
+    handle.write(decoder.decode(b"", final=True))
+    return handle
+
+
+def extract_texts(
+    pdf_files: List[Path],
+    max_workers: int = 1,
+    timeout: Optional[float] = None,
+    page_workers: int = 1,
+    spill_threshold: int = SPILL_THRESHOLD,
+) -> Dict[str, SpooledText]:
+    """
+    Extracts every file in `pdf_files`, spreading files across processes.
+
+    Files whose cleaned text is already in the text cache skip PyMuPDF entirely;
+    successful extractions are added to it. Texts are read from and written to
+    the cache in chunks, so no document is held whole past `spill_threshold`.
+
+    Args:
+        pdf_files (list[Path]): PDFs to read.
+        max_workers (int, optional): Worker processes; 1 reads serially. Defaults to 1.
+        timeout (float, optional): Seconds to wait for each file's result; files read
+            serially then run in a child process so a hung file can be killed. Defaults to None.
+        page_workers (int, optional): Processes used to split a single large PDF into
+            page ranges. Only applies when files are read serially, since pool workers
+            cannot start processes of their own. Defaults to 1.
+        spill_threshold (int, optional): Characters of each text kept in memory before
+            it spills to a temporary file. Defaults to SPILL_THRESHOLD.
+
+    Returns:
+        dict: filename -> SpooledText of the cleaned text (or a failed handle holding
+        "Error reading file: ..."), in input order. The caller should close every handle.
+    """
+    cache = get_text_cache()
+    keys = {}
+    texts = {}
+    for file_path in pdf_files:
+        texts[file_path.name] = None
+        try:
+            keys[file_path] = text_cache_key(file_path)
+        except OSError:
+            # Unreadable or vanished: extraction reports the error for this file.
+            continue
+        texts[file_path.name] = _read_cached(cache, keys[file_path], spill_threshold)
+    misses = [file_path for file_path in pdf_files if texts[file_path.name] is None]
+
+    workers = min(max_workers, len(misses))
+    if workers <= 1:
+        for file_path in misses:
+            if timeout is None:
+                texts[file_path.name] = extract_text(file_path, page_workers, spill_threshold)
+            else:
+                texts[file_path.name] = extract_text_with_timeout(file_path, timeout, page_workers, spill_threshold)
+    else:
+        # Spawned workers only import this module, not the parent's threads or Portia state.
+        with multiprocessing.get_context("spawn").Pool(processes=workers) as pool:
+            pending = [
+                (file_path, pool.apply_async(extract_text, (str(file_path), 1, spill_threshold)))
+                for file_path in misses
+            ]
+            for file_path, result in pending:
+                try:
+                    texts[file_path.name] = result.get(timeout)
+                except multiprocessing.TimeoutError:
+                    texts[file_path.name] = SpooledText.failure(f"Error reading file: timed out after {timeout:.0f}s")
+        # Leaving the block terminates the pool, which also kills any worker still stuck on a file.
+
+    for file_path in misses:
+        handle = texts[file_path.name]
+        if file_path in keys and not handle.failed:
+            cache.set_chunks(keys[file_path], (chunk.encode("utf-8") for chunk in handle))
+    return texts
+
+
+def _extractor_version() -> str:
+    """
+    Hashes this whole module's source (functions, regexes and thresholds alike)
+    plus the PyMuPDF version, so editing any of it invalidates the cache.
+    """
+    digest = hashlib.sha256(Path(__file__).read_bytes())
+    digest.update(fitz.VersionBind.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+EXTRACTOR_VERSION = _extractor_version()
+
+
+def text_cache_key(file_path: Path) -> str:
+    """Cache key for a PDF's cleaned text: its content hash plus EXTRACTOR_VERSION."""
+    return hashlib.sha256(f"{file_sha256(file_path)}:{EXTRACTOR_VERSION}".encode("utf-8")).hexdigest()
+
+
+_text_cache: Optional[DiskCache] = None
+_text_cache_lock = threading.Lock()
+
+
+def get_text_cache() -> DiskCache:
+    """Returns the process-wide text cache configured by TEXT_CACHE_DIR / TEXT_CACHE_MAX_BYTES."""
+    global _text_cache
+    with _text_cache_lock:
+        if _text_cache is None:
+            directory = Path(os.getenv("TEXT_CACHE_DIR", DEFAULT_TEXT_CACHE_DIR))
+            max_bytes = int(os.getenv("TEXT_CACHE_MAX_BYTES", DEFAULT_TEXT_CACHE_MAX_BYTES))
+            _text_cache = DiskCache(directory, max_bytes)
+        return _text_cache
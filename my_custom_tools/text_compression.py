@@ -0,0 +1,192 @@
+"""Local extractive compression of paper text before it is sent to an LLM.
+
+The text is split into pages and sentences, equation debris is dropped,
+near-duplicate sentences (repeated headers, captions, boilerplate) are
+removed, and the remaining sentences are ranked with TextRank over TF-IDF
+vectors. The best-ranked sentences are kept, in reading order, until the
+token budget is used up. The "--- Page N ---" marker of every page that
+keeps a sentence is kept too, so the result can still be chunked by page.
+Everything runs locally with NumPy.
+"""
+
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+import numpy as np
+
+from my_custom_tools.chunking import estimate_tokens, iter_pages, split_pages
+
+_PAGE_MARKER = re.compile(r"--- Page \d+ ---")
+_LEADING_PAGE_MARKER = re.compile(r"\s*(--- Page \d+ ---)")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9(\[\"'])")
+_WORD = re.compile(r"[a-z][a-z0-9-]+")
+
+_STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below between
+both but by can could did do does doing down during each few for from further had has have having he her here
+hers him his how i if in into is it its itself just may me might more most must my no nor not now of off on once
+only or other our ours out over own same she should so some such than that the their theirs them then there these
+they this those through to too under until up very was we were what when where which while who whom why will with
+would you your we us via thus however therefore e.g i.e et al fig figure table section eq
+""".split())
+
+# Minimum share of letters in a sentence; lower means equation or table debris.
+MIN_ALPHA_RATIO = 0.6
+# Sentences with fewer words than this are dropped as fragments.
+MIN_WORDS = 4
+# Vocabulary size of the TF-IDF vectors (most frequent terms by document frequency).
+MAX_FEATURES = 2048
+# Cosine similarity from which a later sentence counts as a duplicate of an earlier one.
+DUPLICATE_THRESHOLD = 0.9
+
+
+class CompressionResult(NamedTuple):
+    """Compressed text and the estimated token counts before and after."""
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+
+def split_sentences(text: str) -> List[str]:
+    """Splits extracted paper text into sentences, dropping page markers."""
+    text = _PAGE_MARKER.sub(" ", text)
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def _is_prose(sentence: str) -> bool:
+    if len(sentence.split()) < MIN_WORDS:
+        return False
+    letters = sum(ch.isalpha() or ch.isspace() for ch in sentence)
+    return letters / len(sentence) >= MIN_ALPHA_RATIO
+
+
+def _paged_sentences(pages: Iterable[str]) -> List[Tuple[str, str]]:
+    """(page marker, sentence) for every sentence; the marker is "" for text without page markers."""
+    paged = []
+    for page in pages:
+        match = _LEADING_PAGE_MARKER.match(page)
+        marker = match.group(1) if match else ""
+        paged.extend((marker, sentence) for sentence in split_sentences(page))
+    return paged
+
+
+def _unique(paged) -> List[Tuple[str, str]]:
+    """Drops exact repeats (ignoring case, digits and punctuation) before the vector comparison."""
+    seen = set()
+    unique = []
+    for marker, sentence in paged:
+        key = " ".join(_WORD.findall(sentence.lower()))
+        if key not in seen:
+            seen.add(key)
+            unique.append((marker, sentence))
+    return unique
+
+
+def _tfidf(sentences: List[str]) -> np.ndarray:
+    """L2-normalized TF-IDF rows, one per sentence."""
+    tokenized = [[w for w in _WORD.findall(s.lower()) if w not in _STOPWORDS] for s in sentences]
+    df = Counter(word for words in tokenized for word in set(words))
+    vocab: Dict[str, int] = {
+        word: i for i, (word, _) in enumerate(df.most_common(MAX_FEATURES))
+    }
+
+    matrix = np.zeros((len(sentences), len(vocab)), dtype=np.float32)
+    for row, words in enumerate(tokenized):
+        columns = [vocab[w] for w in words if w in vocab]
+        np.add.at(matrix[row], columns, 1.0)
+
+    idf = np.log((1 + len(sentences)) / (1 + np.array([df[w] for w in vocab], dtype=np.float32))) + 1
+    matrix *= idf
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+def _duplicates(vectors: np.ndarray, threshold: float, block: int = 512) -> np.ndarray:
+    """Marks rows whose cosine similarity to any earlier row reaches `threshold`."""
+    n = len(vectors)
+    duplicate = np.zeros(n, dtype=bool)
+    for start in range(0, n, block):
+        sims = vectors[start:start + block] @ vectors.T
+        rows = np.arange(start, min(start + block, n))
+        # Only compare with earlier sentences.
+        sims[np.arange(len(rows))[:, None] <= np.arange(n)[None, :] - start] = 0
+        duplicate[rows] = (sims >= threshold).any(axis=1)
+    return duplicate
+
+
+def _textrank(vectors: np.ndarray, damping: float = 0.85, iterations: int = 30) -> np.ndarray:
+    """
+    PageRank over the cosine-similarity graph of the sentences.
+
+    The n x n similarity matrix S = V V^T (without self-loops) is never built;
+    products with it are computed as V (V^T x), so memory stays O(n * features).
+    """
+    n = len(vectors)
+    self_sim = np.einsum("ij,ij->i", vectors, vectors)
+
+    def similarity_times(x: np.ndarray) -> np.ndarray:
+        return vectors @ (vectors.T @ x) - self_sim * x
+
+    degree = similarity_times(np.ones(n, dtype=np.float32))
+    inverse_degree = np.divide(1.0, degree, out=np.zeros_like(degree), where=degree > 1e-9)
+    scores = np.full(n, 1.0 / n, dtype=np.float32)
+    for _ in range(iterations):
+        scores = (1 - damping) / n + damping * similarity_times(scores * inverse_degree)
+    return scores
+
+
+def compress_text(text: Union[str, Iterable[str]], token_budget: int) -> CompressionResult:
+    """
+    Keeps the most informative sentences of `text` within `token_budget`.
+
+    Text already within the budget is returned unchanged. A SpooledText handle
+    is read page by page, so the document is never joined into one string; the
+    sentences that survive the prose filter are still all ranked together.
+
+    Args:
+        text (str | SpooledText): Extracted paper text, as produced by PDFReaderTool,
+            or a handle to it (any sized iterable of text chunks).
+        token_budget (int): Maximum estimated tokens of the result.
+
+    Returns:
+        CompressionResult: The compressed text with token counts before and after.
+    """
+    tokens_before = estimate_tokens(text)
+    if tokens_before <= token_budget:
+        text = text if isinstance(text, str) else "".join(text)
+        return CompressionResult(text, tokens_before, tokens_before)
+
+    pages = split_pages(text) if isinstance(text, str) else iter_pages(text)
+    paged = _unique((marker, s) for marker, s in _paged_sentences(pages) if _is_prose(s))
+    if not paged:
+        return CompressionResult("", tokens_before, 0)
+
+    vectors = _tfidf([s for _, s in paged])
+    keep = ~_duplicates(vectors, DUPLICATE_THRESHOLD)
+    paged = [item for item, k in zip(paged, keep) if k]
+    markers = [marker for marker, _ in paged]
+    sentences = [s for _, s in paged]
+    vectors = vectors[keep]
+
+    scores = _textrank(vectors)
+    selected = []
+    # Leave room for the marker of every page.
+    used = sum(estimate_tokens(marker) + 1 for marker in set(markers) if marker)
+    for index in np.argsort(-scores, kind="stable"):
+        cost = estimate_tokens(sentences[index]) + 1
+        if used + cost > token_budget:
+            continue
+        selected.append(index)
+        used += cost
+
+    pieces = []
+    current_marker = ""
+    for i in sorted(selected):
+        if markers[i] and markers[i] != current_marker:
+            pieces.append(markers[i])
+            current_marker = markers[i]
+        pieces.append(sentences[i])
+    compressed = " ".join(pieces)
+    return CompressionResult(compressed, tokens_before, estimate_tokens(compressed))
@@ -0,0 +1,53 @@
+"""Per-run workspace directories.
+
+Every plan run gets its own directory, named after its plan run ID, and all
+tools that read or write files resolve their paths through it. This keeps
+concurrent runs (e.g. two users of the frontend) from deleting or reading
+each other's papers.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+from pathlib import Path
+
+from portia import ToolRunContext
+
+DEFAULT_WORKSPACE_ROOT = Path(tempfile.gettempdir()) / "explain-workspaces"
+
+
+def workspace_root() -> Path:
+    """Returns the folder holding all run workspaces (WORKSPACE_DIR overrides it)."""
+    return Path(os.getenv("WORKSPACE_DIR", DEFAULT_WORKSPACE_ROOT))
+
+
+def _dir_name(plan_run_id) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(plan_run_id))
+
+
+def workspace_for(plan_run_id) -> Path:
+    """
+    Returns (and creates) the workspace for a plan run.
+
+    Args:
+        plan_run_id: The plan run ID, as found on `ToolRunContext.plan_run_id` or `PlanRun.id`.
+
+    Returns:
+        Path: The run's workspace directory.
+    """
+    path = workspace_root() / _dir_name(plan_run_id)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def papers_dir(context: ToolRunContext) -> Path:
+    """Returns (and creates) the 'papers' folder inside the run's workspace."""
+    path = workspace_for(context.plan_run_id) / "papers"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def cleanup_workspace(plan_run_id) -> None:
+    """Deletes a run's workspace once the run has finished."""
+    shutil.rmtree(workspace_root() / _dir_name(plan_run_id), ignore_errors=True)